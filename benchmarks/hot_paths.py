@@ -0,0 +1,228 @@
+"""
+Micro-benchmarks of the model and serialization code which every request
+goes through, runs offline without mongodb.
+
+    $ python benchmarks/hot_paths.py --output results.json
+    $ python benchmarks/hot_paths.py --compare results.json --threshold 0.1
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId, Timestamp
+from pydantic import Field
+
+from fastpanel.conf import settings
+from fastpanel.core import Setup
+from fastpanel.core.accounts import FastPanelUser
+from fastpanel.core.serializers import FastPanelJSONEncoder, dumps
+from fastpanel.db import registry
+from fastpanel.db.fields import EmbdedField
+from fastpanel.db.models import Model
+from fastpanel.db.utils import get_model
+
+
+class Address(Model):
+    street: str = Field(json_schema_extra={"bsonType": "string"})
+    city: str = Field(json_schema_extra={"bsonType": "string"})
+    zip_code: Optional[str] = Field(default=None, json_schema_extra={"bsonType": ["string", "null"]})
+
+    class Meta:
+        is_nested = True
+
+
+class Customer(Model):
+    name: str = Field(json_schema_extra={"bsonType": "string"})
+    email: Optional[str] = Field(default=None, json_schema_extra={"bsonType": ["string", "null"]})
+    joined_at: datetime = Field(json_schema_extra={"bsonType": "date"})
+    primary_address: Optional[Address] = EmbdedField(Address, default=None)
+    addresses: List[Address] = EmbdedField(Address, "many-to-many", default=[])
+
+    class Meta:
+        hidden_fields = ["email"]
+
+
+BENCHMARK_APP = "benchmarks"
+
+# number of embedded addresses, and of documents in a page
+SIZES = (1, 10, 100)
+
+
+def load_settings():
+    Setup.load_settings(secret_key="benchmarks", db_connection=object(), database={"name": "benchmarks"})
+    app = settings.InstalledApp(BENCHMARK_APP)
+    app._models = [Address, Customer]
+    settings.INSTALLED_APPS.insert(0, app)
+    registry.load(settings.INSTALLED_APPS)
+
+
+def make_user(index: int = 0) -> dict:
+    return {
+        "_id": ObjectId(),
+        "username": "user-%s" % (index),
+        "password": "fpanel_hash_$2b$12$" + "x" * 53,
+        "email": "user-%s@example.com" % (index),
+        "first_name": "First",
+        "last_name": "Last",
+        "date_joined": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index),
+        "last_login": None,
+        "is_active": True,
+    }
+
+
+def make_customer(addresses: int) -> dict:
+    address = {"street": "1 Main Street", "city": "Springfield", "zip_code": "12345"}
+    return {
+        "_id": ObjectId(),
+        "name": "Customer",
+        "email": "customer@example.com",
+        "joined_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "primary_address": dict(address),
+        "addresses": [dict(address) for _ in range(addresses)],
+    }
+
+
+def make_page(size: int) -> list:
+    page = []
+    for index in range(size):
+        document = make_user(index)
+        document["last_login"] = Timestamp(1700000000 + index, 1)
+        page.append(document)
+    return page
+
+
+def get_benchmarks() -> dict:
+    from fastpanel.core.auth.utils import create_token, decode_token, token_cache
+
+    user = make_user()
+    user_obj = FastPanelUser(**user)
+    customer_schema = Customer.model_json_schema()
+    user_schema = FastPanelUser.model_json_schema()
+    expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+    payload = json.loads(user_obj.model_dump_json())
+    token = create_token(payload, expiry)
+
+    def decode_uncached():
+        token_cache.clear()
+        decode_token(token)
+
+    benchmarks = {
+        "construct/user": lambda: FastPanelUser(**user),
+        "model_dump/user": lambda: user_obj.model_dump(),
+        "model_dump/user/dump_all": lambda: user_obj.model_dump(dump_all=True),
+        "model_attrs/user": lambda: FastPanelUser._get_model_attrs(user_schema, False),
+        "model_attrs/customer": lambda: Customer._get_model_attrs(customer_schema, False),
+        "bson_schema/user": FastPanelUser.get_bson_schema,
+        "bson_schema/customer": Customer.get_bson_schema,
+        "get_model/hit": lambda: get_model(BENCHMARK_APP, "Customer"),
+        "get_model/miss": lambda: get_model(BENCHMARK_APP, "Unknown"),
+        "jwt/create": lambda: create_token(payload, expiry),
+        "jwt/decode": decode_uncached,
+        "jwt/decode/cached": lambda: decode_token(token),
+    }
+
+    for size in SIZES:
+        customer = make_customer(size)
+        customer_obj = Customer(**customer)
+        page = make_page(size)
+        benchmarks["construct/customer/%s" % (size)] = lambda customer=customer: Customer(**customer)
+        benchmarks["model_dump/customer/%s" % (size)] = lambda obj=customer_obj: obj.model_dump()
+        benchmarks["model_dump/customer/%s/dump_all" % (size)] = lambda obj=customer_obj: obj.model_dump(dump_all=True)
+        benchmarks["json_encoder/page/%s" % (size)] = lambda page=page: json.dumps(page, cls=FastPanelJSONEncoder)
+        benchmarks["orjson/page/%s" % (size)] = lambda page=page: dumps(page)
+    return benchmarks
+
+
+# benchmarks whose speedup over another one is printed, by the prefix of their names
+SPEEDUP_BASELINES = {"orjson/": "json_encoder/"}
+
+
+def get_speedup(name: str, results: dict) -> str:
+    for prefix, baseline_prefix in SPEEDUP_BASELINES.items():
+        if not name.startswith(prefix): continue
+        baseline = baseline_prefix + name[len(prefix):]
+        if baseline in results:
+            return "  %5.1fx faster than %s" % (results[baseline]["min_us"] / results[name]["min_us"], baseline)
+    return ""
+
+
+def measure(func, repeat: int, min_time: float) -> dict:
+    # grow the number of calls till a run takes at least `min_time`
+    timer = timeit.Timer(func)
+    number, elapsed = 1, timer.timeit(1)
+    while elapsed < min_time:
+        number *= 10 if elapsed < min_time / 10 else 2
+        elapsed = timer.timeit(number)
+
+    runs = [timer.timeit(number) / number * 1e6 for _ in range(repeat)]
+    return {
+        "min_us": min(runs),
+        "median_us": statistics.median(runs),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    print("\n%-36s %12s %12s %8s" % ("benchmark", "baseline us", "current us", "change"))
+    for name, result in results.items():
+        if name not in baseline: continue
+        before, after = baseline[name]["min_us"], result["min_us"]
+        change = after / before - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print("%-36s %12.2f %12.2f %+7.1f%%%s" % (name, before, after, change * 100, flag))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="Only run the benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per benchmark")
+    parser.add_argument("--min_time", type=float, default=0.1, help="Minimum duration of a run in seconds")
+    parser.add_argument("--output", default=None, help="File to write the results to, as json")
+    parser.add_argument("--compare", default=None, help="Results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression, 0.1 is 10%%")
+    args = parser.parse_args()
+
+    load_settings()
+    results = {}
+    for name, func in get_benchmarks().items():
+        if args.filter not in name: continue
+        results[name] = measure(func, args.repeat, args.min_time)
+        print("%-36s %10.2f us%s" % (name, results[name]["min_us"], get_speedup(name, results)), file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    elif not args.compare:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.threshold)
+        if regressions:
+            print("\n%s benchmarks regressed by more than %.0f%%" % (len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
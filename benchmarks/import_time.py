@@ -0,0 +1,69 @@
+"""
+Measures the time taken for importing the fastpanel entry points in a fresh
+interpreter and fails when it goes over the budget.
+
+    $ python benchmarks/import_time.py
+    $ python benchmarks/import_time.py --runs 10 --scale 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module: (budget in milliseconds, modules which it must not import)
+BUDGETS = {
+    "fastpanel.cli": (250, ("fastapi", "jose", "passlib", "motor", "pydantic")),
+    "fastpanel.conf.settings": (100, ("fastapi", "jose", "passlib", "motor", "pydantic")),
+    "fastpanel.db.models": (600, ("fastapi", "jose", "passlib", "motor")),
+}
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"elapsed_ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module)],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the budgets, for slow machines")
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget_ms, forbidden) in BUDGETS.items():
+        # the first run warms up the bytecode cache
+        results = [measure(module) for _ in range(args.runs + 1)][1:]
+        elapsed_ms = statistics.median(result["elapsed_ms"] for result in results)
+        imported = [
+            name for name in forbidden
+            if any(loaded == name or loaded.startswith(name + ".") for loaded in results[0]["modules"])
+        ]
+
+        budget_ms *= args.scale
+        ok = elapsed_ms <= budget_ms and not imported
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module}: {elapsed_ms:.1f}ms (budget {budget_ms:.0f}ms)")
+        if imported:
+            print(f"     imports {', '.join(imported)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,7 @@
-from .connector import init, deinit
\ No newline at end of file
+# the connector pulls in fastapi, it's only imported once `init` or `deinit` is used
+# so that the cli and the models can be imported without it
+def __getattr__(name):
+    if name in ("init", "deinit"):
+        from . import connector
+        return getattr(connector, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
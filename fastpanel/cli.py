@@ -1,9 +1,20 @@
 import asyncio
 import pathlib
+import time
 import click
 
-from .core import Setup
-from .utils import parse_config_file
+
+def load_settings(ctx, **overrides):
+    """
+    Loads the settings from the config file, fastpanel is imported
+    here so that the commands which don't need it start faster
+    """
+    from .core import Setup
+    from .utils import parse_config_file
+
+    config = parse_config_file(ctx.obj["config_file"])
+    config.update(overrides)
+    return Setup.load_settings(**config)
 
 
 async def push_data(collection, data): return await collection.insert_one(data)
@@ -42,9 +53,7 @@ def createuser(ctx, username: str, email: str, first_name: str, last_name: str):
         confirmation_prompt=True,
         type=str
     )
-    config = parse_config_file(ctx.obj["config_file"])
-    config.pop("apps")
-    Setup.load_settings(**config)
+    load_settings(ctx, apps=[])
 
     from .core.accounts import FastPanelUser
     from .db.utils import get_db_client
@@ -61,6 +70,153 @@ def createuser(ctx, username: str, email: str, first_name: str, last_name: str):
     asyncio.run(push_data(collection, user.model_dump(True)))
 
 
+@cli.command()
+@click.option('--target_ms', type=float, default=250, help="Target time for hashing a password")
+@click.option('--scheme', type=click.Choice(["bcrypt", "argon2"]), default="bcrypt")
+def calibrate(target_ms: float, scheme: str):
+    """
+    Find the highest password hashing cost which stays within the
+    target time on this machine
+    """
+    from passlib import hash as hashers
+    from passlib.exc import MissingBackendError
+
+    hasher = getattr(hashers, scheme)
+    min_rounds, max_rounds = (4, 20) if scheme == "bcrypt" else (1, 20)
+    selected_rounds = min_rounds
+
+    # the first hash loads the backend, keep it out of the timings
+    try:
+        hasher.using(rounds=min_rounds).hash("fastpanel-calibration")
+    except MissingBackendError:
+        raise click.ClickException(f'No backend for {scheme}, install it with: pip install "fastpanel[{scheme}]"')
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        hasher.using(rounds=rounds).hash("fastpanel-calibration")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        click.echo(f"{scheme} rounds={rounds}: {elapsed_ms:.1f}ms")
+
+        if elapsed_ms > target_ms: break
+        selected_rounds = rounds
+
+    click.echo("\nAdd the following to your config file:")
+    click.echo(f"password_hash_scheme: {scheme}")
+    click.echo(f"password_hash_rounds: {selected_rounds}")
+
+
+async def write_export(model, output, format: str, partitions: int, include_hidden: bool) -> int:
+    from .core.export import export_objects
+
+    rows = 0
+    async for chunk in export_objects(model, format, partitions, include_hidden):
+        output.write(chunk)
+        rows += 1
+
+    # the first chunk of a csv export is its header
+    return rows - 1 if format == "csv" else rows
+
+
+@cli.command()
+@click.pass_context
+@click.option('--app', 'app_name', prompt="Enter the app name", type=str)
+@click.option('--model', 'model_name', prompt="Enter the model name", type=str)
+@click.option('--format', 'format', type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option('--output', type=click.File("w"), default="-", help="File to write the export to")
+@click.option('--partitions', type=int, default=None, help="Number of _id ranges scanned concurrently")
+@click.option('--include-hidden', 'include_hidden', is_flag=True, default=False,
+              help="Keep the hidden fields, ex. the password hashes, so that the file can be imported again")
+def export(ctx, app_name: str, model_name: str, format: str, output, partitions: int, include_hidden: bool):
+    """
+    Export all the objects of a model as ndjson or csv, without the hidden fields by default
+    """
+    settings = load_settings(ctx)
+
+    from .db.utils import get_model
+
+    model = get_model(app_name, model_name)
+    if not model:
+        raise click.BadParameter(f"Unable to find the model {model_name} in {app_name}")
+
+    start = time.perf_counter()
+    rows = asyncio.run(write_export(
+        model, output, format, partitions or settings.EXPORT_PARTITIONS, include_hidden
+    ))
+    elapsed = time.perf_counter() - start
+    click.echo(f"Exported {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)", err=True)
+
+
+@cli.command(name="import")
+@click.pass_context
+@click.option('--app', 'app_name', prompt="Enter the app name", type=str)
+@click.option('--model', 'model_name', prompt="Enter the model name", type=str)
+@click.option('--input', 'input_path', type=click.Path(exists=True, dir_okay=False), required=True)
+@click.option('--format', 'format', type=click.Choice(["ndjson", "csv"]), default=None,
+              help="Format of the input file, detected from its extension by default")
+@click.option('--batch_size', type=int, default=None, help="Number of rows inserted at once")
+@click.option('--concurrency', type=int, default=None, help="Number of batches written at the same time")
+@click.option('--workers', type=int, default=0, help="Number of processes validating the rows")
+@click.option('--rejects', type=click.Path(dir_okay=False), default=None, help="File for the rejected rows")
+@click.option('--resume', is_flag=True, default=False, help="Resume an interrupted import")
+def import_objects(
+        ctx, app_name: str, model_name: str, input_path: str, format: str,
+        batch_size: int, concurrency: int, workers: int, rejects: str, resume: bool
+    ):
+    """
+    Import objects of a model from a ndjson or csv file, an export
+    has to keep the required hidden fields with `--include-hidden`
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from .core import importer
+
+    settings = load_settings(ctx)
+
+    from .db.utils import get_model
+
+    model = get_model(app_name, model_name)
+    if not model:
+        raise click.BadParameter(f"Unable to find the model {model_name} in {app_name}")
+
+    input_path = pathlib.Path(input_path)
+    format = format or ("csv" if input_path.suffix.lower() == ".csv" else "ndjson")
+    rejects_path = pathlib.Path(rejects or f"{input_path}.rejects.ndjson")
+    progress = importer.ImportProgress(pathlib.Path(f"{input_path}.checkpoint"), resume)
+
+    if progress.resumed_from:
+        click.echo(f"Resuming after line {progress.resumed_from}", err=True)
+
+    def report(progress: importer.ImportProgress):
+        click.echo(
+            f"\rinserted: {progress.inserted}, rejected: {progress.rejected}, "
+            f"skipped: {progress.skipped} ({progress.rate:.0f} rows/s)",
+            nl=False, err=True
+        )
+
+    executor = None
+    if workers > 0:
+        worker_settings = {key: getattr(settings, key) for key in importer.WORKER_SETTINGS}
+        executor = ProcessPoolExecutor(workers, initializer=importer.init_worker, initargs=(worker_settings,))
+
+    try:
+        with open(rejects_path, "a" if resume else "w") as rejects_file:
+            asyncio.run(importer.import_rows(
+                model,
+                importer.iter_rows(input_path, format),
+                rejects_file,
+                batch_size=batch_size or settings.IMPORT_BATCH_SIZE,
+                concurrency=concurrency or settings.IMPORT_CONCURRENCY,
+                executor=executor,
+                progress=progress,
+                on_progress=report
+            ))
+    finally:
+        if executor: executor.shutdown()
+        click.echo(err=True)
+
+    progress.checkpoint_path.unlink(missing_ok=True)
+    if progress.rejected:
+        click.echo(f"{progress.rejected} rows were rejected, see {rejects_path}", err=True)
+
+
 # @cli.command()
 # @click.pass_context
 # def inspect(ctx):
@@ -71,20 +227,26 @@ def createuser(ctx, username: str, email: str, first_name: str, last_name: str):
 #     pass
 
 
-# @cli.command()
-# @click.pass_context
-# def install(ctx):
-#     """
-#     Register models to the database
-#     Tip: Make sure that the `__init__.py` file is present in your app
-#     otherwise it may fail to locate your `models`
-#     """
-#     config = parse_config_file(ctx.obj["config_file"])
-#     Setup.load_settings(**config)
+@cli.command()
+@click.pass_context
+@click.option('--dry-run', 'dry_run', is_flag=True, default=False, help="Only print the planned changes")
+def install(ctx, dry_run: bool):
+    """
+    Register models to the database
+    Tip: Make sure that the `__init__.py` file is present in your app
+    otherwise it may fail to locate your `models`
+    """
+    load_settings(ctx)
 
-#     from .db.models import Model
-#     asyncio.run(Setup.load_models(Model._conn))
+    from .core import Setup
+    from .db.models import Model
+    plans = asyncio.run(Setup.load_models(Model._conn, dry_run=dry_run))
 
+    changes = [line for plan in plans for line in plan.describe()]
+    for line in changes:
+        click.echo(f"{'would ' if dry_run else ''}{line}")
+    if not changes:
+        click.echo("Models are in sync with the database")
 
 if __name__ == '__main__':
     cli()
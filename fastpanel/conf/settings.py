@@ -31,7 +31,13 @@ class InstalledApp:
     def __init__(self, app_name, models_lookup = MODELS_LOOKUP) -> None:
         self.app_name: str = app_name
         self.models_lookup = models_lookup
-        self.models = self._discover_models()
+        self._models = None
+
+    @property
+    def models(self):
+        # the models module is imported on first access
+        if self._models is None: self._models = self._discover_models()
+        return self._models
     
     def __repr__(self) -> str:
         return f"<InstalledApp app_name='{self.app_name}'>"
@@ -42,4 +48,62 @@ ACCESS_TOKEN_EXPIRATION: int = 3600
 
 REFRESH_TOKEN_EXPIRATION: int = 86400
 
-UI_MOUNT_URL: str = "/"
\ No newline at end of file
+UI_MOUNT_URL: str = "/"
+
+PAGE_SIZE: int = 100
+
+MAX_PAGE_SIZE: int = 1000
+
+STREAM_BATCH_SIZE: int = 500
+
+TOKEN_CACHE_SIZE: int = 1024
+
+USER_CACHE_SIZE: int = 1024
+
+USER_CACHE_TTL: int = 60
+
+USER_CACHE_WATCH: bool = False
+
+PASSWORD_HASH_SCHEME: str = "bcrypt"
+
+PASSWORD_HASH_ROUNDS: int = 12
+
+PASSWORD_HASH_WORKERS: int = 2
+
+BULK_MAX_SIZE: int = 1000
+
+SEARCH_COLLATION: dict = {"locale": "en", "strength": 2}
+
+COUNT_MAX_TIME_MS: int = 2000
+
+COUNT_CACHE_TTL: int = 10
+
+COUNT_CACHE_SIZE: int = 256
+
+EXPORT_PARTITIONS: int = 4
+
+EXPORT_SAMPLES_PER_PARTITION: int = 20
+
+IMPORT_BATCH_SIZE: int = 1000
+
+IMPORT_CONCURRENCY: int = 4
+
+INSTALL_UPDATE_VALIDATORS: bool = False
+
+STATIC_MEMORY_MAX_SIZE: int = 256 * 1024
+
+STATIC_MAX_AGE: int = 31536000
+
+METRICS_ENABLED: bool = False
+
+METRICS_TOKEN: str = ""
+
+SLOW_QUERY_MS: int = 500
+
+SLOW_QUERY_LOG_SIZE: int = 100
+
+CHANGE_STREAM_BUFFER_SIZE: int = 1000
+
+CHANGE_STREAM_QUEUE_SIZE: int = 1000
+
+CHANGE_STREAM_HEARTBEAT: int = 15
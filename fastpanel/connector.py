@@ -1,18 +1,20 @@
+import asyncio
 import logging
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from pydantic import FilePath
 
 from . import core
-from .utils import parse_config_file, setup_frontend
+from .utils import parse_config_file
+from .utils.frontend import FrontendFiles, setup_frontend
 from .db.models import Model
+from .db.utils import warmup_pool
 
 
 app = FastAPI()
 logger = logging.getLogger("uvicorn")
-
+background_tasks = set()
 
 
 # middleware to check whether settings are loaded or not
@@ -35,9 +37,19 @@ async def init(
     config = parse_config_file(config_file)
     core.Setup.load_settings(db_connection=conn, **config)
 
+    # open the connections upto `minPoolSize` before serving
+    await warmup_pool(Model._conn)
+
     # load middlewares
     await core.Setup.load_middlewares(app)
     await core.Setup.load_models(Model._conn)
+    core.Setup.load_metadata()
+
+    # start the background listeners
+    from .conf import settings
+    if settings.USER_CACHE_WATCH:
+        from .core.auth.utils import watch_user_changes
+        background_tasks.add(asyncio.create_task(watch_user_changes()))
 
     # load frontend
     FRONTEND_DIR = setup_frontend(Path(__file__).parent / "preact-app" / "fast-panel")
@@ -45,7 +57,12 @@ async def init(
     app.include_router(core.auth_router, prefix="/auth", tags=["Auth"])
     app.include_router(core.accounts_router, prefix="/accounts", tags=["Account"])
     app.include_router(core.core_router, prefix="/core", tags=["Core"])
-    app.mount(mount_path, StaticFiles(directory=str(FRONTEND_DIR), html=True), name="preact-app")
+    if settings.METRICS_ENABLED:
+        from .core.metrics import metrics_endpoint
+        if not settings.METRICS_TOKEN:
+            logger.warning("/metrics is served without authentication, set `metrics_token` to protect it")
+        app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.mount(mount_path, FrontendFiles(FRONTEND_DIR), name="preact-app")
 
     # mount the root application
     root_app.mount("/fastpanel", app, name="FastPanel")
@@ -53,6 +70,12 @@ async def init(
 
 
 async def deinit():
+    for task in background_tasks: task.cancel()
+    background_tasks.clear()
+
+    from .core.changes import close_all
+    close_all()
+
     if hasattr(Model, "_conn"):
         Model._conn.close()
 
@@ -1,4 +1,21 @@
-from .setup import Setup
-from .accounts import accounts_router
-from .auth import auth_router
-from .routers import router as core_router
\ No newline at end of file
+import importlib
+
+
+# the routers are imported on first access, so that importing
+# `Setup` doesn't load the whole api
+_LAZY_ATTRIBUTES = {
+    "Setup": (".setup", "Setup"),
+    "accounts_router": (".accounts", "accounts_router"),
+    "auth_router": (".auth", "auth_router"),
+    "core_router": (".routers", "router"),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module(module_name, __name__), attribute)
+    globals()[name] = value
+    return value
@@ -1,2 +1,8 @@
 from .models import FastPanelUser
-from .routers import router as accounts_router
\ No newline at end of file
+
+
+def __getattr__(name):
+    if name == "accounts_router":
+        from .routers import router
+        return router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -67,10 +67,10 @@ class FastPanelUser(Model):
     @field_validator("password")
     @classmethod
     def make_password(cls, password: str) -> str:
-        if password.startswith("fpanel_hash_"):
+        from ..auth.utils import HASH_PREFIX, get_password_hash
+        if password.startswith(HASH_PREFIX):
             return password
         else:
-            from ..auth.utils import get_password_hash
             return get_password_hash(password)
 
     class Meta:
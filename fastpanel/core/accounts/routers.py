@@ -1,4 +1,6 @@
 from fastapi import APIRouter
 
+from ..responses import FastPanelJSONResponse
 
-router = APIRouter()
+
+router = APIRouter(default_response_class=FastPanelJSONResponse)
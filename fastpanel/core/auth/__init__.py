@@ -1 +1,5 @@
-from .routers import router as auth_router
\ No newline at end of file
+def __getattr__(name):
+    if name == "auth_router":
+        from .routers import router
+        return router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,12 +3,13 @@ from fastapi.security import OAuth2PasswordRequestForm
 from pymongo import ReturnDocument
 
 from .schemas import LoginRes
-from .utils import verify_password, create_auth_tokens
+from .utils import verify_and_update_password, create_auth_tokens, run_hashing
 from ..accounts import FastPanelUser
+from ..responses import FastPanelJSONResponse
 from ...utils import timezone
 
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastPanelJSONResponse)
 
 
 @router.post("/login", response_model=LoginRes)
@@ -22,15 +23,22 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if not user.is_active: raise exceptions.HTTPException(403, "User is inactive")
 
     try:
-        if not verify_password(form_data.password, user.password):
+        is_valid, new_hash = await run_hashing(
+            verify_and_update_password, form_data.password, user.password
+        )
+        if not is_valid:
             raise error
     except Exception as e:
         print(e)
         raise exceptions.HTTPException(400, "Incorrect password! Please try again")
 
+    # rehash the password if the hashing cost has changed
+    changes = {"last_login": timezone.now()}
+    if new_hash: changes["password"] = new_hash
+
     document = await collection.find_one_and_update(
         {"_id": user.id},
-        {"$set": {"last_login": timezone.now()}},
+        {"$set": changes},
         return_document=ReturnDocument.AFTER
     )
 
@@ -1,6 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Union
+from hashlib import sha256
+from typing import Optional, Tuple, Union
+import asyncio
 import json
+import logging
 
 from bson import ObjectId
 from fastapi import exceptions, Depends, Request
@@ -8,23 +12,122 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from jose.exceptions import JWTError, JWTClaimsError, ExpiredSignatureError
 from passlib.context import CryptContext
+from pymongo.errors import PyMongoError
 
 from ..accounts import FastPanelUser
 from ...conf import settings
 from ...utils import timezone
+from ...utils.cache import TTLCache
 
 
+logger = logging.getLogger("uvicorn")
 oauth2_scheme = lambda: OAuth2PasswordBearer(tokenUrl=f"/fastpanel/auth/login")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+HASH_PREFIX = "fpanel_hash_"
 
+# hashing is cpu bound, it runs on this pool instead of the event loop
+_hashing_executor: Optional[ThreadPoolExecutor] = None
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password.strip("fpanel_hash_"))
+
+class TokenCache(TTLCache):
+    """
+    Caches the payloads of the verified tokens till they expire,
+    the cache is cleared whenever the secret key changes
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.secret_key = None
+
+    def get_payload(self, token: str):
+        if self.secret_key != settings.SECRET_KEY:
+            self.clear()
+            self.secret_key = settings.SECRET_KEY
+        return self.get(sha256(token.encode()).digest())
+
+    def set_payload(self, token: str, payload: dict):
+        if "exp" not in payload: return
+        self.set(sha256(token.encode()).digest(), payload, expires_at=payload["exp"])
+
+
+token_cache = TokenCache()
+
+# users fetched by `logged_in_user`, keyed by the user id
+user_cache = TTLCache()
+
+
+def configure_password_hashing():
+    """
+    Applies the hashing scheme and cost from the settings, hashes
+    made with any other scheme or cost are upgraded on the next login
+    """
+    global _hashing_executor
+    scheme = settings.PASSWORD_HASH_SCHEME
+    schemes = [scheme] if scheme == "bcrypt" else [scheme, "bcrypt"]
+    pwd_context.update(
+        schemes=schemes,
+        deprecated="auto",
+        **{f"{scheme}__rounds": settings.PASSWORD_HASH_ROUNDS}
+    )
+
+    if _hashing_executor: _hashing_executor.shutdown(wait=False)
+    _hashing_executor = None
+
+
+def configure():
+    """
+    Sizes the caches and sets up the hashing as per the loaded settings
+    """
+    token_cache.maxsize = settings.TOKEN_CACHE_SIZE
+    user_cache.maxsize = settings.USER_CACHE_SIZE
+    user_cache.ttl = settings.USER_CACHE_TTL
+    configure_password_hashing()
+
+
+def get_hashing_executor() -> ThreadPoolExecutor:
+    global _hashing_executor
+    if _hashing_executor is None:
+        _hashing_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="fastpanel-hashing"
+        )
+    return _hashing_executor
+
+
+def _strip_prefix(hashed_password: str) -> str:
+    if hashed_password.startswith(HASH_PREFIX):
+        return hashed_password[len(HASH_PREFIX):]
+    return hashed_password
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies the password, and rehashes it if its hash uses an outdated
+    scheme or cost. Returns whether the password is valid along
+    with the new hash, if any
+    """
+    valid, new_hash = pwd_context.verify_and_update(plain_password, _strip_prefix(hashed_password))
+    return valid, HASH_PREFIX + new_hash if new_hash else None
 
 
 def get_password_hash(password: str):
     hashed_string = pwd_context.hash(password)
-    return "fpanel_hash_" + hashed_string
+    return HASH_PREFIX + hashed_string
+
+
+async def run_hashing(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hashing_executor(), func, *args)
+
+
+async def hash_password_field(data: dict):
+    """
+    Hashes the raw password present in the data off the event loop,
+    so that the model validators don't have to hash it
+    """
+    password = data.get("password")
+    if isinstance(password, str) and not password.startswith(HASH_PREFIX):
+        data["password"] = await run_hashing(get_password_hash, password)
 
 
 def create_token(data: Union[str, dict], expiry: datetime):
@@ -36,6 +139,9 @@ def create_token(data: Union[str, dict], expiry: datetime):
 
 
 def decode_token(token: str):
+    payload = token_cache.get_payload(token)
+    if payload is not None: return dict(payload)
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
     except (JWTError, JWTClaimsError, ExpiredSignatureError):
@@ -44,7 +150,9 @@ def decode_token(token: str):
             "Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return payload
+
+    token_cache.set_payload(token, payload)
+    return dict(payload)
 
 
 def create_new_access_token(refresh_token: str):
@@ -59,13 +167,40 @@ async def auth_required(token: str = Depends(oauth2_scheme(), use_cache=False)):
 
 
 async def logged_in_user(req: Request, payload: dict = Depends(auth_required)):
-    collection = FastPanelUser.get_collection()
-    fetched_user = await collection.find_one({"_id": ObjectId(payload["user_id"])})
-    user = FastPanelUser(**fetched_user)
+    # tokens created by `create_auth_tokens` carry the dumped user
+    user_id = payload.get("_id", payload.get("user_id"))
+    user = user_cache.get(user_id)
+    if user is None:
+        collection = FastPanelUser.get_collection()
+        fetched_user = await collection.find_one({"_id": ObjectId(user_id)})
+        if not fetched_user: raise exceptions.HTTPException(401, "User not found")
+        user = FastPanelUser(**fetched_user)
+        user_cache.set(user_id, user)
+
     if not user.is_active: raise exceptions.HTTPException(403, "User is inactive")
     return user
 
 
+def invalidate_user(user_id: Union[str, ObjectId]):
+    user_cache.pop(str(user_id))
+
+
+async def watch_user_changes():
+    """
+    Invalidates the cached users which are modified outside fastpanel,
+    needs a replica set for opening the change stream
+    """
+    collection = FastPanelUser.get_collection()
+    try:
+        async with collection.watch() as stream:
+            async for change in stream:
+                if "documentKey" in change:
+                    invalidate_user(change["documentKey"]["_id"])
+    except PyMongoError as e:
+        logger.warning(f"stopped watching the users for changes: {e}")
+        user_cache.clear()
+
+
 def create_auth_tokens(user: FastPanelUser):
     """
     Creates access and refresh token
@@ -75,4 +210,7 @@ def create_auth_tokens(user: FastPanelUser):
 
     access_token = create_token(user.model_dump_json(), access_expiry)
     refresh_token = create_token(user.model_dump_json(), refresh_expiry)
-    return {"access_token": access_token, "refresh_token": refresh_token}
\ No newline at end of file
+    return {"access_token": access_token, "refresh_token": refresh_token}
+
+
+configure()
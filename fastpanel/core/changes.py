@@ -0,0 +1,286 @@
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import re
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .serializers import dumps
+from ..conf import settings
+
+
+logger = logging.getLogger("uvicorn")
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+# the operations forwarded to the clients, the rest end the stream
+DOCUMENT_OPERATIONS = ("insert", "update", "replace", "delete")
+
+# delay before the browsers reconnect, in milliseconds
+RETRY_MS = 3000
+
+HEARTBEAT = b": ping\n\n"
+
+# tells the client that its last event can't be resumed from, the list has to be fetched again
+RESET_EVENT = b"event: reset\ndata: {}\n\n"
+
+RESUME_TOKEN_PATTERN = re.compile(r"[0-9A-Fa-f]+")
+
+# shared change streams, keyed by the collection name
+feeds: Dict[str, "ChangeFeed"] = {}
+
+
+def get_event_id(resume_token: dict) -> str:
+    return resume_token["_data"]
+
+
+def get_resume_token(event_id: Optional[str]) -> Optional[dict]:
+    """
+    Converts the `Last-Event-ID` sent by the client back to a resume token,
+    raises `ValueError` if it isn't one
+    """
+    if not event_id: return None
+    if not RESUME_TOKEN_PATTERN.fullmatch(event_id):
+        raise ValueError("Invalid event id: %s" % (event_id))
+    return {"_data": event_id}
+
+
+def is_hidden(path: str, hidden_fields: frozenset) -> bool:
+    return path.split(".", 1)[0] in hidden_fields
+
+
+def get_event_data(model, change: dict) -> dict:
+    """
+    Converts a change event to the data sent to the clients, the updates
+    carry only the changed fields. Hidden fields are removed
+    """
+    hidden_fields = model._get_hidden_db_fields()
+    operation = change["operationType"]
+    data = {"operation": operation, "_id": change["documentKey"]["_id"]}
+
+    if operation in ("insert", "replace"):
+        data["document"] = {
+            key: value for key, value in change["fullDocument"].items()
+            if key not in hidden_fields
+        }
+    elif operation == "update":
+        description = change["updateDescription"]
+        data["updated_fields"] = {
+            path: value for path, value in description.get("updatedFields", {}).items()
+            if not is_hidden(path, hidden_fields)
+        }
+        data["removed_fields"] = [
+            path for path in description.get("removedFields", [])
+            if not is_hidden(path, hidden_fields)
+        ]
+    return data
+
+
+def format_event(event: str, data, event_id: Optional[str] = None) -> bytes:
+    lines = [b"event: " + event.encode(), b"data: " + dumps(data)]
+    if event_id: lines.insert(0, b"id: " + event_id.encode())
+    return b"\n".join(lines) + b"\n\n"
+
+
+class Subscription:
+    """
+    Events of a feed for a single client. A client which doesn't keep
+    up is disconnected, it resumes from its last event on reconnecting
+    """
+
+    def __init__(self, feed: "ChangeFeed", events: List[bytes] = ()) -> None:
+        self.feed = feed
+        self.closed = False
+        self.queue = asyncio.Queue(maxsize=settings.CHANGE_STREAM_QUEUE_SIZE + len(events))
+        for event in events: self.queue.put_nowait(event)
+
+    def push(self, event: bytes):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("disconnecting a slow subscriber of %s" % (self.feed.collection_name))
+            self.feed.unsubscribe(self)
+            self.closed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def iter_events(self) -> AsyncIterator[bytes]:
+        yield b"retry: %d\n\n" % (RETRY_MS)
+        try:
+            while True:
+                if self.closed and self.queue.empty(): return
+                try:
+                    event = await asyncio.wait_for(self.queue.get(), settings.CHANGE_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # keeps the proxies from closing an idle connection
+                    yield HEARTBEAT
+                    continue
+
+                if event is None: return
+                yield event
+        finally:
+            self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """
+    A change stream of a collection whose events are sent to every subscriber,
+    the stream is opened with the first subscriber and closed after the last one.
+    The recent events are kept so that the clients can resume from them.
+    A feed which isn't shared catches up a client resuming from an older event,
+    and hands it off to the shared feed once that one has the next events
+    """
+
+    def __init__(self, model, resume_token: Optional[dict] = None, shared: bool = True) -> None:
+        self.model = model
+        self.collection_name = model.get_collection_name()
+        self.resume_token = resume_token
+        self.shared = shared
+        self.subscribers = set()
+        self.stopped = False
+        # id of the last event seen
+        self.position = get_event_id(resume_token) if resume_token else None
+        self.events = deque(maxlen=settings.CHANGE_STREAM_BUFFER_SIZE)
+        # whether the first events were dropped from `events`
+        self.truncated = False
+        self.ready = asyncio.get_running_loop().create_future()
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        collection = self.model.get_collection()
+        try:
+            async with collection.watch(resume_after=self.resume_token) as stream:
+                while stream.alive and not self.stopped:
+                    change = await stream.try_next()
+                    # the stream is opened by the first `try_next`
+                    if not self.ready.done(): self.ready.set_result(None)
+                    if change is not None:
+                        if change["operationType"] not in DOCUMENT_OPERATIONS:
+                            self.publish(format_event("invalidate", {"operation": change["operationType"]}))
+                            break
+
+                        self.position = get_event_id(change["_id"])
+                        self.publish(format_event("change", get_event_data(self.model, change), self.position))
+
+                    if not self.shared: self.hand_off()
+        except PyMongoError as e:
+            if not self.ready.done():
+                self.ready.set_exception(e)
+            else:
+                logger.warning("stopped watching %s for changes: %s" % (self.collection_name, e))
+        finally:
+            self.stop()
+
+    def publish(self, event: bytes):
+        if len(self.events) == self.events.maxlen: self.truncated = True
+        self.events.append(event)
+        for subscription in list(self.subscribers):
+            subscription.push(event)
+
+    def get_events_after(self, event_id: str) -> Optional[List[bytes]]:
+        """
+        Returns the kept events which came after `event_id`,
+        `None` if the event isn't kept anymore
+        """
+        if self.resume_token and event_id == get_event_id(self.resume_token):
+            return None if self.truncated else list(self.events)
+
+        prefix = b"id: " + event_id.encode() + b"\n"
+        events = []
+        for event in reversed(self.events):
+            if event.startswith(prefix): return events[::-1]
+            events.append(event)
+        return None
+
+    def subscribe(self, events: List[bytes] = ()) -> Subscription:
+        subscription = Subscription(self, events)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def adopt(self, subscription: Subscription, events: List[bytes]):
+        subscription.feed = self
+        self.subscribers.add(subscription)
+        for event in events: subscription.push(event)
+
+    def hand_off(self):
+        """
+        Moves the subscribers to the shared feed once it holds the events
+        after the position of this feed, this feed becomes the shared
+        one if there isn't any
+        """
+        shared = feeds.get(self.collection_name)
+        if shared is None:
+            self.shared = True
+            feeds[self.collection_name] = self
+            return
+
+        events = shared.get_events_after(self.position)
+        if events is None: return
+        for subscription in list(self.subscribers):
+            shared.adopt(subscription, events)
+        self.subscribers.clear()
+        self.stop()
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        if not self.subscribers: self.stop()
+
+    def stop(self):
+        self.stopped = True
+        if self.shared and feeds.get(self.collection_name) is self:
+            feeds.pop(self.collection_name)
+        for subscription in list(self.subscribers):
+            subscription.close()
+        self.subscribers.clear()
+        if not self.ready.done(): self.ready.cancel()
+        if not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+
+async def open_subscription(model, event_id: Optional[str], events: List[bytes] = ()) -> Subscription:
+    resume_token = get_resume_token(event_id)
+    feed = feeds.get(model.get_collection_name())
+
+    if feed is None:
+        feed = feeds[model.get_collection_name()] = ChangeFeed(model, resume_token)
+    elif event_id:
+        kept_events = feed.get_events_after(event_id)
+        if kept_events is not None:
+            events = [*events, *kept_events]
+        else:
+            # the event is older than the kept ones, a stream of its own catches up from it
+            feed = ChangeFeed(model, resume_token, shared=False)
+
+    subscription = feed.subscribe(events)
+    try:
+        await asyncio.shield(feed.ready)
+    except BaseException:
+        feed.unsubscribe(subscription)
+        raise
+    return subscription
+
+
+async def subscribe(model, event_id: Optional[str] = None) -> Subscription:
+    """
+    Subscribes to the changes of the model's collection, resuming after `event_id`
+    if it's passed. raises `ValueError` for an invalid `event_id` and `PyMongoError`
+    if the change stream can't be opened, ex. when the server isn't a replica set
+    """
+    try:
+        return await open_subscription(model, event_id)
+    except OperationFailure as e:
+        if not event_id: raise
+        logger.warning("unable to resume the changes of %s: %s" % (model.get_collection_name(), e))
+
+    return await open_subscription(model, None, [RESET_EVENT])
+
+
+def close_all():
+    for feed in list(feeds.values()):
+        feed.stop()
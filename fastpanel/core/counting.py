@@ -0,0 +1,50 @@
+import json
+
+from pymongo.errors import ExecutionTimeout
+
+from ..conf import settings
+from ..utils.cache import TTLCache
+
+
+# counts of the filtered queries, keyed by the collection and the filter
+count_cache = TTLCache()
+
+
+async def count_objects(
+        model,
+        query: dict = None,
+        exact: bool = False,
+        collation: dict = None,
+        collection = None
+    ) -> dict:
+    """
+    Counts the documents of the model, without a query the count is
+    estimated from the collection metadata unless `exact` is passed.
+    Exact counts are bounded by `settings.COUNT_MAX_TIME_MS` and cached
+    for `settings.COUNT_CACHE_TTL` seconds. Pass the `collection` for
+    counting with other read options than the ones of the model
+    """
+    if collection is None: collection = model.get_collection()
+    if not query and not exact:
+        return {"count": await collection.estimated_document_count(), "exact": False}
+
+    query = query or {}
+    key = (
+        model.get_collection_name(),
+        json.dumps(query, sort_keys=True, default=str),
+        json.dumps(collation, sort_keys=True)
+    )
+    count = count_cache.get(key)
+    if count is not None:
+        return {"count": count, "exact": True}
+
+    kwargs = {"maxTimeMS": settings.COUNT_MAX_TIME_MS}
+    if collation: kwargs["collation"] = collation
+
+    try:
+        count = await collection.count_documents(query, **kwargs)
+    except ExecutionTimeout:
+        return {"count": None, "exact": False}
+
+    count_cache.set(key, count)
+    return {"count": count, "exact": True}
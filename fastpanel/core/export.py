@@ -0,0 +1,138 @@
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
+import csv
+import io
+import json
+
+from bson import ObjectId
+
+from ..conf import settings
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+Partition = Tuple[Optional[ObjectId], Optional[ObjectId]]
+
+_DONE = object()
+
+
+async def get_partitions(collection, count: int) -> List[Partition]:
+    """
+    Splits the collection into `count` ranges of `_id` holding roughly
+    the same number of documents, using a random sample of the `_id`s
+    """
+    if count <= 1: return [(None, None)]
+
+    cursor = collection.aggregate([
+        {"$sample": {"size": count * settings.EXPORT_SAMPLES_PER_PARTITION}},
+        {"$project": {"_id": 1}},
+    ])
+    samples = sorted({document["_id"] async for document in cursor})
+    if len(samples) < count: return [(None, None)]
+
+    step = len(samples) / count
+    bounds = [samples[int(step * i)] for i in range(1, count)]
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+def get_partition_query(partition: Partition) -> dict:
+    lower, upper = partition
+    query = {}
+    if lower is not None: query["$gte"] = lower
+    if upper is not None: query["$lt"] = upper
+    return {"_id": query} if query else {}
+
+
+async def scan_partition(collection, partition: Partition, projection: dict, queue: asyncio.Queue):
+    try:
+        cursor = collection.find(get_partition_query(partition), projection) \
+            .sort([("_id", 1)]) \
+            .batch_size(settings.STREAM_BATCH_SIZE)
+        async for document in cursor:
+            await queue.put(document)
+    except Exception as e:
+        # raised again by the consumer
+        await queue.put(e)
+    else:
+        await queue.put(_DONE)
+
+
+async def iter_documents(collection, projection: dict = None, partitions: int = 1) -> AsyncIterator[dict]:
+    """
+    Scans the partitions of the collection concurrently and yields their documents
+    as they arrive, in `_id` order within each partition. The partitions share a
+    queue holding at most `settings.STREAM_BATCH_SIZE` unconsumed documents
+    """
+    queue = asyncio.Queue(maxsize=settings.STREAM_BATCH_SIZE)
+    bounds = await get_partitions(collection, partitions)
+    tasks = [
+        asyncio.create_task(scan_partition(collection, partition, projection, queue))
+        for partition in bounds
+    ]
+
+    try:
+        remaining = len(tasks)
+        while remaining:
+            document = await queue.get()
+            if document is _DONE:
+                remaining -= 1
+                continue
+            if isinstance(document, Exception): raise document
+            yield document
+    finally:
+        for task in tasks: task.cancel()
+
+
+def get_export_columns(model, include_hidden: bool = False) -> List[str]:
+    hidden_fields = set() if include_hidden else set(model._meta.default.hidden_fields)
+    return [
+        model.get_db_field_name(name)
+        for name in model.model_fields if name not in hidden_fields
+    ]
+
+
+async def export_objects(
+        model, format: str = "ndjson", partitions: int = 1, include_hidden: bool = False
+    ) -> AsyncIterator[str]:
+    """
+    Exports every document of the model as ndjson or csv without the hidden fields,
+    with `include_hidden` they are kept so that the export can be imported again
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError("Unsupported format: %s" % (format))
+
+    collection = model.get_collection()
+    projection = None if include_hidden else model.get_projection()
+    documents = iter_documents(collection, projection, max(1, partitions))
+
+    if format == "ndjson":
+        async for document in documents:
+            if include_hidden:
+                yield model(**document).model_dump_json(dump_all=True) + "\n"
+            else:
+                yield model.dump_document_json(document, projection) + "\n"
+        return
+
+    columns = get_export_columns(model, include_hidden)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    async for document in documents:
+        if include_hidden:
+            data = model(**document).model_dump(mode="json", dump_all=True)
+        else:
+            data = model.dump_document(document, projection)
+        writer.writerow([
+            json.dumps(value) if isinstance(value, (dict, list)) else value
+            for value in (data.get(column) for column in columns)
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
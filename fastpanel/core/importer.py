@@ -0,0 +1,209 @@
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+import asyncio
+import csv
+import json
+import time
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from ..conf import settings
+
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+# settings which the validation workers need to behave like the parent process
+WORKER_SETTINGS = ("PASSWORD_HASH_SCHEME", "PASSWORD_HASH_ROUNDS", "TIMEZONE")
+
+DUPLICATE_KEY_ERROR = 11000
+
+Row = Tuple[int, dict]
+
+
+def parse_csv_value(value: str):
+    if value == "": return None
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def iter_rows(path: Path, format: str) -> Iterator[Row]:
+    """
+    Reads the rows of the file one at a time, along with their line number.
+    Empty csv cells are skipped so that the defaults of the model apply
+    """
+    with open(path, "r", newline="") as file:
+        if format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, {
+                    key: parse_csv_value(value)
+                    for key, value in row.items() if value != ""
+                }
+            return
+
+        for line_no, line in enumerate(file, start=1):
+            if not line.strip(): continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, {"__invalid_json__": str(e), "__line__": line}
+
+
+def init_worker(worker_settings: dict):
+    for key, value in worker_settings.items(): setattr(settings, key, value)
+
+    from .auth.utils import configure_password_hashing
+    configure_password_hashing()
+
+
+def validate_rows(model, rows: List[Row]) -> Tuple[List[Row], List[dict]]:
+    """
+    Validates the rows against the model, returns the documents ready to be
+    inserted along with the rejected rows. Runs on the validation workers
+    """
+    documents, rejected = [], []
+    for line_no, row in rows:
+        if "__invalid_json__" in row:
+            rejected.append({"line": line_no, "errors": [{"msg": row["__invalid_json__"]}], "row": row["__line__"]})
+            continue
+
+        try:
+            documents.append((line_no, model(**row).model_dump(dump_all=True)))
+        except ValidationError as e:
+            rejected.append({
+                "line": line_no,
+                "errors": json.loads(e.json(include_url=False)),
+                "row": row
+            })
+    return documents, rejected
+
+
+class ImportProgress:
+    """
+    Keeps the counters of an import, and the line upto which
+    every row has been processed so that the import can be resumed
+    """
+
+    def __init__(self, checkpoint_path: Optional[Path] = None, resume: bool = False) -> None:
+        self.checkpoint_path = checkpoint_path
+        self.inserted = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.started_at = time.perf_counter()
+        self.completed_line = 0
+        self._batches = deque()
+
+        if resume and checkpoint_path and checkpoint_path.is_file():
+            self.completed_line = int(checkpoint_path.read_text().strip() or 0)
+        self.resumed_from = self.completed_line
+
+    @property
+    def rate(self) -> float:
+        return self.inserted / max(time.perf_counter() - self.started_at, 1e-6)
+
+    def start_batch(self, last_line: int) -> list:
+        batch = [last_line, False]
+        self._batches.append(batch)
+        return batch
+
+    def complete_batch(self, batch: list):
+        """
+        Batches finish out of order, the checkpoint only moves past
+        a batch once all the batches before it have finished
+        """
+        batch[1] = True
+        while self._batches and self._batches[0][1]:
+            self.completed_line = self._batches.popleft()[0]
+
+        if self.checkpoint_path:
+            self.checkpoint_path.write_text(str(self.completed_line))
+
+
+async def import_rows(
+        model,
+        rows: Iterator[Row],
+        rejects_file=None,
+        batch_size: int = 1000,
+        concurrency: int = 4,
+        executor: Optional[Executor] = None,
+        progress: Optional[ImportProgress] = None,
+        on_progress: Optional[Callable[[ImportProgress], None]] = None,
+    ) -> ImportProgress:
+    """
+    Validates and inserts the rows in batches, upto `concurrency` batches
+    are written to the db at the same time using unordered `insert_many`.
+    Rejected rows are written to the `rejects_file` as ndjson
+    """
+    loop = asyncio.get_running_loop()
+    collection = model.get_collection()
+    progress = progress or ImportProgress()
+    in_flight = asyncio.Semaphore(concurrency)
+    tasks, failures = set(), []
+
+    def write_rejects(rejected: List[dict]):
+        progress.rejected += len(rejected)
+        if rejects_file is None: return
+        for entry in rejected:
+            rejects_file.write(json.dumps(entry, default=str) + "\n")
+
+    async def insert(batch: List[Row], checkpoint: list):
+        try:
+            if executor:
+                documents, rejected = await loop.run_in_executor(executor, validate_rows, model, batch)
+            else:
+                documents, rejected = validate_rows(model, batch)
+            write_rejects(rejected)
+
+            if documents:
+                try:
+                    await collection.insert_many([document for _, document in documents], ordered=False)
+                    progress.inserted += len(documents)
+                except BulkWriteError as e:
+                    failed = []
+                    for error in e.details.get("writeErrors", []):
+                        line_no, document = documents[error["index"]]
+                        # rows inserted before an interrupted import are skipped
+                        if error.get("code") == DUPLICATE_KEY_ERROR and "_id" in error.get("keyPattern", {}):
+                            progress.skipped += 1
+                            continue
+                        failed.append({
+                            "line": line_no,
+                            "errors": [{"msg": error.get("errmsg"), "code": error.get("code")}],
+                            "row": document
+                        })
+                    progress.inserted += e.details.get("nInserted", 0)
+                    write_rejects(failed)
+
+            progress.complete_batch(checkpoint)
+            if on_progress: on_progress(progress)
+        finally:
+            in_flight.release()
+
+    def on_done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            failures.append(task.exception())
+
+    rows = ((line_no, row) for line_no, row in rows if line_no > progress.resumed_from)
+    while not failures:
+        batch = list(islice(rows, batch_size))
+        if not batch: break
+
+        await in_flight.acquire()
+        task = asyncio.create_task(insert(batch, progress.start_batch(batch[-1][0])))
+        tasks.add(task)
+        task.add_done_callback(on_done)
+
+    if tasks: await asyncio.gather(*tasks, return_exceptions=True)
+
+    # the checkpoint stops before the failed batch, resume the import from there
+    if failures: raise failures[0]
+    return progress
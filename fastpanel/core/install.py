@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List
+
+from pymongo import IndexModel, TEXT
+
+from .search import get_search_indexes
+from ..conf import settings
+
+
+logger = logging.getLogger("uvicorn")
+
+# options which change the behaviour of an index, the rest are ignored while diffing
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation")
+
+
+def to_index_model(index: dict) -> IndexModel:
+    """
+    Converts an index of `Meta.indexes`, which holds the arguments of
+    `create_index`, to an `IndexModel`
+    """
+    options = dict(index)
+    return IndexModel(options.pop("keys"), **options)
+
+
+def get_declared_indexes(model) -> List[IndexModel]:
+    return [
+        *(to_index_model(index) for index in model._meta.default.indexes),
+        *get_search_indexes(model)
+    ]
+
+
+def get_index_key(index: dict) -> tuple:
+    key = list(index["key"].items())
+    if "_fts" not in index["key"]:
+        return tuple(key)
+
+    # text indexes are listed by the server with their weights instead of their fields
+    fields = [(field, value) for field, value in key if field not in ("_fts", "_ftsx")]
+    fields.extend((field, TEXT) for field in sorted(index.get("weights", {})))
+    return tuple(fields)
+
+
+def normalize_key(key: tuple) -> tuple:
+    text_fields = sorted(field for field, value in key if value == TEXT)
+    if not text_fields: return key
+    return tuple((field, value) for field, value in key if value != TEXT) + \
+        tuple((field, TEXT) for field in text_fields)
+
+
+def index_matches(declared: dict, existing: dict) -> bool:
+    if normalize_key(get_index_key(declared)) != normalize_key(get_index_key(existing)):
+        return False
+
+    for option in INDEX_OPTIONS:
+        if option == "collation" and option in declared:
+            # the server fills in the defaults of the collation
+            collation = existing.get(option, {})
+            if any(collation.get(key) != value for key, value in declared[option].items()):
+                return False
+        elif declared.get(option) != existing.get(option):
+            # `unique: false` is the same as leaving it out
+            if bool(declared.get(option)) or bool(existing.get(option)):
+                return False
+    return True
+
+
+class InstallPlan:
+    """
+    Changes needed for bringing the collection of a model in sync with
+    its declaration. Indexes which aren't declared by the model are left
+    as they are, only the declared indexes which differ are rebuilt. An
+    undeclared index with the same keys and options stands for the declared one.
+    The validator is updated only with `settings.INSTALL_UPDATE_VALIDATORS`
+    """
+
+    def __init__(self, model) -> None:
+        self.model = model
+        self.collection_name, self.validator = model.get_bson_schema()
+        self.create_collection = False
+        self.validator_changed = False
+        self.update_validator = False
+        self.create_indexes: List[IndexModel] = []
+        self.rebuild_indexes: List[IndexModel] = []
+        self.extra_indexes: List[str] = []
+        # names of the undeclared indexes standing for the declared ones
+        self.matched_indexes: Dict[str, str] = {}
+
+    @property
+    def has_changes(self) -> bool:
+        return self.create_collection or self.update_validator or \
+            bool(self.create_indexes) or bool(self.rebuild_indexes)
+
+    def describe(self) -> List[str]:
+        lines = []
+        if self.create_collection:
+            lines.append(f"create collection {self.collection_name}")
+        if self.update_validator:
+            lines.append(f"update the validator of {self.collection_name}")
+        elif self.validator_changed:
+            lines.append(
+                f"keep the outdated validator of {self.collection_name}, "
+                "set install_update_validators to update it"
+            )
+        for index in self.create_indexes:
+            lines.append(f"create index {index.document['name']} on {self.collection_name}")
+        for index in self.rebuild_indexes:
+            lines.append(f"rebuild index {index.document['name']} on {self.collection_name}")
+        for name, existing_name in self.matched_indexes.items():
+            lines.append(f"use the existing index {existing_name} for {name} on {self.collection_name}")
+        for name in self.extra_indexes:
+            lines.append(f"keep undeclared index {name} on {self.collection_name}")
+        return lines
+
+
+async def get_plan(db, model, collections: dict) -> InstallPlan:
+    plan = InstallPlan(model)
+    declared = get_declared_indexes(model)
+
+    if plan.collection_name not in collections:
+        plan.create_collection = True
+        plan.create_indexes = declared
+        return plan
+
+    options = collections[plan.collection_name].get("options", {})
+    plan.validator_changed = options.get("validator") != plan.validator
+    plan.update_validator = plan.validator_changed and settings.INSTALL_UPDATE_VALIDATORS
+
+    existing = {
+        index["name"]: index
+        async for index in db[plan.collection_name].list_indexes()
+    }
+    declared_names = {index.document["name"] for index in declared}
+    undeclared = {name: index for name, index in existing.items() if name not in declared_names}
+    for index in declared:
+        document = index.document
+        if document["name"] in existing:
+            if not index_matches(document, existing[document["name"]]):
+                plan.rebuild_indexes.append(index)
+            continue
+
+        # creating an index with the same keys and options under another name fails
+        matched_name = next((name for name, other in undeclared.items() if index_matches(document, other)), None)
+        if matched_name is None:
+            plan.create_indexes.append(index)
+        else:
+            plan.matched_indexes[document["name"]] = matched_name
+            undeclared.pop(matched_name)
+
+    plan.extra_indexes = [name for name in undeclared if name != "_id_"]
+    return plan
+
+
+async def apply_plan(db, plan: InstallPlan):
+    collection = db[plan.collection_name]
+    if plan.create_collection:
+        logger.info(f"installing {plan.collection_name} model...")
+        await db.create_collection(plan.collection_name, validator=plan.validator)
+    elif plan.update_validator:
+        logger.info(f"updating the validator of {plan.collection_name}...")
+        await db.command("collMod", plan.collection_name, validator=plan.validator)
+
+    for index in plan.rebuild_indexes:
+        logger.warning(f"rebuilding index {index.document['name']} of {plan.collection_name}")
+        await collection.drop_index(index.document["name"])
+
+    indexes = plan.create_indexes + plan.rebuild_indexes
+    if indexes:
+        logger.info(f"adding {len(indexes)} indexes to {plan.collection_name}")
+        await collection.create_indexes(indexes)
+
+
+async def install_models(db, models: Iterable, dry_run: bool = False) -> List[InstallPlan]:
+    """
+    Diffs the collections and indexes of the models against the database
+    and applies the changes, the models are installed concurrently.
+    With `dry_run` the changes are only planned
+    """
+    collections = {}
+    async for collection in await db.list_collections():
+        collections[collection["name"]] = collection
+
+    # models sharing a collection are installed by the first one of them
+    unique_models = {}
+    for model in models: unique_models.setdefault(model.get_collection_name(), model)
+
+    plans = await asyncio.gather(*(get_plan(db, model, collections) for model in unique_models.values()))
+    if not dry_run:
+        await asyncio.gather(*(apply_plan(db, plan) for plan in plans if plan.has_changes))
+
+    for plan in plans:
+        if plan.validator_changed and not plan.update_validator:
+            logger.warning(
+                f"the validator of {plan.collection_name} is outdated, "
+                "set install_update_validators to update it"
+            )
+        for name in plan.extra_indexes:
+            logger.info(f"{plan.collection_name} has the undeclared index {name}, leaving it as it is")
+    return list(plans)
@@ -0,0 +1,98 @@
+from hashlib import sha256
+import logging
+
+from .serializers import dumps
+from ..conf import settings
+
+
+logger = logging.getLogger("uvicorn")
+
+
+class CachedPayload:
+    """
+    A json payload which is encoded once and served
+    with a strong ETag
+    """
+
+    def __init__(self, data) -> None:
+        self.content = dumps(data)
+        self.etag = '"%s"' % (sha256(self.content).hexdigest()[:32])
+
+    def is_fresh(self, request: "Request") -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match: return False
+
+        for etag in if_none_match.split(","):
+            etag = etag.strip()
+            if etag.startswith("W/"): etag = etag[2:]
+            if etag in ("*", self.etag): return True
+        return False
+
+    def to_response(self, request: "Request") -> "Response":
+        from fastapi import Response, status
+
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.is_fresh(request):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(
+            content=self.content,
+            status_code=status.HTTP_200_OK,
+            media_type="application/json",
+            headers=headers
+        )
+
+
+# payloads of the `fetch-apps` route, keyed by the app name
+# the payload for all the apps is stored against `None`
+APPS: dict = {}
+
+# payloads of the `attributes` route, keyed by the model
+MODEL_ATTRIBUTES: dict = {}
+
+_stats = {"hits": 0, "misses": 0}
+
+
+def load():
+    """
+    Drops the metadata of the previously loaded settings, it's
+    computed again by `precompute` or on first access
+    """
+    APPS.clear()
+    MODEL_ATTRIBUTES.clear()
+
+
+def precompute():
+    """
+    Computes the metadata of every installed app and model, called by
+    the server once the models are loaded so that no request has to
+    """
+    APPS[None] = CachedPayload(settings.INSTALLED_APPS)
+    for app in settings.INSTALLED_APPS:
+        APPS[app.app_name] = CachedPayload([app])
+
+        for model in app.models:
+            try:
+                MODEL_ATTRIBUTES[model] = CachedPayload(model.dump_model_attributes())
+            except Exception as e:
+                logger.warning(f"unable to load the attributes of {model.get_model_name()}: {e}")
+
+
+def get_apps_payload(app_name: str = None) -> CachedPayload:
+    _stats["hits" if app_name in APPS else "misses"] += 1
+    if app_name not in APPS:
+        apps = [app for app in settings.INSTALLED_APPS if app_name in (None, app.app_name)]
+        if not apps and app_name is not None: return CachedPayload([])
+        APPS[app_name] = CachedPayload(apps)
+    return APPS[app_name]
+
+
+def get_model_attributes_payload(model) -> CachedPayload:
+    _stats["hits" if model in MODEL_ATTRIBUTES else "misses"] += 1
+    if model not in MODEL_ATTRIBUTES:
+        MODEL_ATTRIBUTES[model] = CachedPayload(model.dump_model_attributes())
+    return MODEL_ATTRIBUTES[model]
+
+
+def get_cache_stats() -> dict:
+    return {**_stats, "size": len(APPS) + len(MODEL_ATTRIBUTES)}
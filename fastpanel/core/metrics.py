@@ -0,0 +1,275 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from hmac import compare_digest
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import time
+
+from pymongo import monitoring
+
+
+# the charset is added by the response
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# labels of the request being handled, filled in by the handlers
+_request_labels: ContextVar[Optional[dict]] = ContextVar("fastpanel_request_labels", default=None)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    labels = ['%s="%s"' % (name, escape(value)) for name, value in zip(names, values)]
+    if extra: labels.append(extra)
+    return "{%s}" % (",".join(labels)) if labels else ""
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = Lock()
+
+    def render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            "# HELP %s %s" % (self.name, self.documentation),
+            "# TYPE %s %s" % (self.name, self.type),
+            *self.render_samples(),
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, *labels, value: float):
+        # for the values which are counted elsewhere and collected while rendering
+        with self._lock: self._values[labels] = value
+
+    def clear(self):
+        with self._lock: self._values.clear()
+
+    def render_samples(self) -> List[str]:
+        with self._lock: values = list(self._values.items())
+        return ["%s%s %s" % (self.name, format_labels(self.labels, key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=REQUEST_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        # counts of the buckets are stored per bucket, they are accumulated while rendering
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def render_samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(buckets), total) for key, (buckets, total) in self._values.items()]
+
+        lines = []
+        for key, buckets, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), buckets):
+                cumulative += count
+                lines.append("%s_bucket%s %s" % (self.name, format_labels(self.labels, key, 'le="%s"' % (bound)), cumulative))
+            lines.append("%s_sum%s %s" % (self.name, format_labels(self.labels, key), total))
+            lines.append("%s_count%s %s" % (self.name, format_labels(self.labels, key), cumulative))
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "fastpanel_http_request_duration_seconds",
+    "Latency of the fastpanel requests",
+    ("route", "method", "model", "operation"),
+)
+REQUESTS = Counter(
+    "fastpanel_http_requests_total",
+    "Number of fastpanel requests by their status",
+    ("route", "method", "model", "operation", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "fastpanel_http_requests_in_flight",
+    "Number of fastpanel requests being handled",
+    ("method",),
+)
+COMMAND_DURATION = Histogram(
+    "fastpanel_mongo_command_duration_seconds",
+    "Duration of the mongodb commands",
+    ("command", "collection"),
+    COMMAND_BUCKETS,
+)
+COMMAND_ERRORS = Counter(
+    "fastpanel_mongo_command_errors_total",
+    "Number of failed mongodb commands",
+    ("command", "collection"),
+)
+CACHE_HITS = Counter("fastpanel_cache_hits_total", "Number of cache hits", ("cache",))
+CACHE_MISSES = Counter("fastpanel_cache_misses_total", "Number of cache misses", ("cache",))
+CACHE_SIZE = Gauge("fastpanel_cache_size", "Number of entries in the cache", ("cache",))
+POOL_CONNECTIONS = Gauge("fastpanel_mongo_pool_connections", "Open connections of the pool", ("address",))
+POOL_CHECKED_OUT = Gauge("fastpanel_mongo_pool_checked_out", "Connections checked out of the pool", ("address",))
+
+METRICS = (
+    REQUEST_DURATION, REQUESTS, REQUESTS_IN_FLIGHT,
+    COMMAND_DURATION, COMMAND_ERRORS,
+    CACHE_HITS, CACHE_MISSES, CACHE_SIZE,
+    POOL_CONNECTIONS, POOL_CHECKED_OUT,
+)
+
+
+def label_request(**labels):
+    """
+    Adds labels to the metrics of the request being handled, if any
+    """
+    request_labels = _request_labels.get()
+    if request_labels is not None: request_labels.update(labels)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and status of the requests, labelled by their
+    route template and endpoint so that the number of series stays bounded
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        labels = {"model": "", "status": "500"}
+        token = _request_labels.set(labels)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                labels["status"] = str(message["status"])
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.dec(method)
+            _request_labels.reset(token)
+
+            route = scope.get("route")
+            endpoint = scope.get("endpoint")
+            # the static files and the unknown routes are reported together
+            route_path = getattr(route, "path", "other")
+            operation = getattr(endpoint, "__name__", "") if route is not None else ""
+
+            REQUEST_DURATION.observe(elapsed, route_path, method, labels["model"], operation)
+            REQUESTS.inc(route_path, method, labels["model"], operation, labels["status"])
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Records the duration and the failures of the mongodb commands
+    """
+
+    def __init__(self) -> None:
+        self._collections = {}
+
+    def get_key(self, event) -> tuple:
+        return (event.request_id, event.connection_id, event.operation_id)
+
+    def started(self, event):
+        collection = event.command.get("collection") if event.command_name == "getMore" \
+            else event.command.get(event.command_name)
+        self._collections[self.get_key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(self.get_key(event), "")
+        COMMAND_DURATION.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._collections.pop(self.get_key(event), "")
+        COMMAND_DURATION.observe(event.duration_micros / 1e6, event.command_name, collection)
+        COMMAND_ERRORS.inc(event.command_name, collection)
+
+
+command_metrics = CommandMetrics()
+
+
+def collect_cache_metrics():
+    from . import metadata
+    from .auth.utils import token_cache, user_cache
+    from .counting import count_cache
+
+    caches = {
+        "jwt": token_cache.stats,
+        "user": user_cache.stats,
+        "count": count_cache.stats,
+        "schema": metadata.get_cache_stats(),
+    }
+    for name, stats in caches.items():
+        CACHE_HITS.set(name, value=stats["hits"])
+        CACHE_MISSES.set(name, value=stats["misses"])
+        CACHE_SIZE.set(name, value=stats["size"])
+
+
+def collect_pool_metrics():
+    from ..db.monitoring import pool_metrics
+
+    POOL_CONNECTIONS.clear()
+    POOL_CHECKED_OUT.clear()
+    for address, stats in pool_metrics.snapshot().items():
+        POOL_CONNECTIONS.set(address, value=stats["open"])
+        POOL_CHECKED_OUT.set(address, value=stats["checked_out"])
+
+
+def render_metrics() -> str:
+    collect_cache_metrics()
+    collect_pool_metrics()
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+async def metrics_endpoint(request):
+    """
+    Serves the metrics in the prometheus text format, pass
+    `settings.METRICS_TOKEN` as a bearer token if it's set
+    """
+    from fastapi import Response, status
+    from ..conf import settings
+
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not compare_digest(token, settings.METRICS_TOKEN):
+            return Response(status_code=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"})
+
+    return Response(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
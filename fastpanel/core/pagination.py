@@ -0,0 +1,117 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Optional
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Query, exceptions, status
+
+from .slow_queries import record_query
+from ..conf import settings
+
+
+def encode_cursor(object_id: ObjectId) -> str:
+    return urlsafe_b64encode(ObjectId(object_id).binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (InvalidId, TypeError, ValueError):
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+
+
+class PageParams:
+    """
+    Keyset pagination over `_id`, use it as a dependency on the
+    routes which return a list of documents
+    :param limit: number of documents in a page, capped at `settings.MAX_PAGE_SIZE`
+    :param after: cursor of the document after which the page starts
+    :param before: cursor of the document before which the page ends
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1),
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ):
+        if after and before:
+            raise exceptions.HTTPException(
+                status.HTTP_400_BAD_REQUEST,
+                "Pass either 'after' or 'before', not both"
+            )
+        self.requested_limit = limit
+        self.limit = min(limit or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+        self.after = decode_cursor(after) if after else None
+        self.before = decode_cursor(before) if before else None
+
+    @property
+    def is_backwards(self) -> bool:
+        return self.before is not None
+
+    def get_query(self, query: dict = None) -> dict:
+        """
+        Narrows down the query to the documents of the requested page
+        """
+        if self.after: bound = {"_id": {"$gt": self.after}}
+        elif self.before: bound = {"_id": {"$lt": self.before}}
+        else: return query or {}
+
+        if not query: return bound
+        return {"$and": [query, bound]}
+
+    def get_sort(self) -> list:
+        return [("_id", -1 if self.is_backwards else 1)]
+
+
+class Page:
+    """
+    A page of documents along with the cursors of the
+    adjacent pages
+    """
+
+    def __init__(self, documents: list, params: PageParams):
+        has_more = len(documents) > params.limit
+        documents = documents[:params.limit]
+        if params.is_backwards: documents.reverse()
+
+        self.documents = documents
+        self.next_cursor = None
+        self.previous_cursor = None
+
+        if not documents: return
+
+        first_id, last_id = documents[0]["_id"], documents[-1]["_id"]
+        if params.is_backwards:
+            self.next_cursor = encode_cursor(last_id)
+            if has_more: self.previous_cursor = encode_cursor(first_id)
+        else:
+            if has_more: self.next_cursor = encode_cursor(last_id)
+            if params.after: self.previous_cursor = encode_cursor(first_id)
+
+    @property
+    def headers(self) -> dict:
+        headers = {}
+        if self.next_cursor: headers["X-Next-Cursor"] = self.next_cursor
+        if self.previous_cursor: headers["X-Previous-Cursor"] = self.previous_cursor
+        return headers
+
+
+async def paginate(
+        collection, query: dict, params: PageParams,
+        projection: dict = None, collation: dict = None
+    ) -> Page:
+    """
+    Fetches a single page of documents matching the query,
+    one extra document is fetched to find out if there are more pages
+    """
+    query, sort = params.get_query(query), params.get_sort()
+    cursor = collection.find(query, projection, collation=collation) \
+        .sort(sort) \
+        .limit(params.limit + 1)
+
+    start = time.perf_counter()
+    documents = await cursor.to_list(params.limit + 1)
+    record_query(collection, query, sort, projection, collation, params.limit + 1, time.perf_counter() - start)
+    return Page(documents, params)
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from fastapi import Query, exceptions, status
+
+from ..db.concerns import get_read_concern, get_read_preference
+
+
+class ReadOptions:
+    """
+    Per request overrides of the read preference and read concern
+    of the model, use it as a dependency on the routes which only read
+    :param read_preference: mode of the read preference, ex. `secondaryPreferred`
+    :param max_staleness: maximum replication lag of the secondaries in seconds
+    :param read_concern: level of the read concern, ex. `majority`
+    """
+
+    def __init__(
+        self,
+        read_preference: Optional[str] = None,
+        max_staleness: Optional[int] = Query(None, ge=90),
+        read_concern: Optional[str] = None,
+    ):
+        if max_staleness is not None and read_preference is None:
+            raise exceptions.HTTPException(
+                status.HTTP_400_BAD_REQUEST,
+                "Pass the 'read_preference' along with 'max_staleness'"
+            )
+
+        try:
+            self.read_preference = get_read_preference(read_preference, max_staleness)
+            self.read_concern = get_read_concern(read_concern)
+        except ValueError as e:
+            raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+    def get_collection(self, model):
+        return model.get_collection(
+            read_preference=self.read_preference,
+            read_concern=self.read_concern
+        )
@@ -0,0 +1,13 @@
+from fastapi.responses import JSONResponse
+
+from .serializers import dumps
+
+
+class FastPanelJSONResponse(JSONResponse):
+    """
+    Encodes the content with orjson, the values read from
+    the db can be returned as they are
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
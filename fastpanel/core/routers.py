@@ -1,48 +1,95 @@
 from typing import Optional
-import json
+import asyncio
 
 from bson import ObjectId
 from fastapi import (
     APIRouter,
     status,
+    Request,
     Response,
     exceptions,
     Depends,
 )
+from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
-from pymongo import ReturnDocument
-
-from . import schemas
-from .auth.utils import auth_required
-from ..core.serializers import FastPanelJSONEncoder
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from . import metadata, schemas, slow_queries
+from .changes import EVENT_STREAM_MEDIA_TYPE, subscribe as subscribe_to_changes
+from .counting import count_objects
+from .export import EXPORT_FORMATS, export_objects
+from .metrics import label_request
+from .accounts import FastPanelUser
+from .auth.utils import auth_required, hash_password_field, invalidate_user, user_cache
+from .pagination import PageParams, paginate
+from .read_options import ReadOptions
+from .responses import FastPanelJSONResponse
+from .search import compile_search
+from .streaming import stream_objects, wants_stream
 from ..conf import settings
 from ..db.models import Model
-from ..db.utils import get_model
+from ..db.monitoring import pool_metrics
+from ..db.utils import get_model as lookup_model
+
+
+router = APIRouter(default_response_class=FastPanelJSONResponse)
+
+
+def get_projection(model: Model, fields: Optional[str] = None):
+    try:
+        return model.get_projection(fields.split(",") if fields else None)
+    except ValueError as e:
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+
+def get_model(app_name: str = "fastpanel.core.accounts", model_name: str = "FastPanelUser") -> Model:
+    model = lookup_model(app_name, model_name)
+    if model: label_request(model=model.get_model_name())
+    return model
+
+
+async def get_missing_error(collection, query: dict) -> exceptions.HTTPException:
+    # the object exists if only its version didn't match
+    if len(query) > 1 and await collection.find_one({"_id": query["_id"]}, {"_id": 1}):
+        return exceptions.HTTPException(
+            status.HTTP_409_CONFLICT,
+            "Object was modified by someone else, fetch it again and retry"
+        )
+    return exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Object not found")
 
 
-router = APIRouter()
+def get_version_query(model: Model, version: int):
+    """
+    Matches the version sent by the client, the documents written before
+    `Meta.version_field` was added don't have the field and are dumped
+    with its default
+    """
+    version_field = model._meta.default.version_field
+    field_names = {model.get_db_field_name(name): name for name in model.model_fields}
+    field = model.model_fields.get(field_names.get(version_field, version_field))
+    if field is not None and not field.is_required() and version == field.get_default(call_default_factory=True):
+        return {"$in": [version, None]}
+    return version
 
 
 @router.get("/fetch-apps")
 def fetch_models(
+        request: Request,
         app_name: Optional[str] = None,
         _ = Depends(auth_required),
     ):
-    apps = settings.INSTALLED_APPS
-    if app_name:
-        apps = list(filter(lambda x: x.app_name == app_name, apps))
-
-    data = json.dumps(apps, cls=FastPanelJSONEncoder)
-    return Response(
-        content=data,
-        status_code=status.HTTP_200_OK,
-        headers={"Content-Type": "application/json"}
-    )
+    return metadata.get_apps_payload(app_name).to_response(request)
 
 
 @router.get("/models/objects/")
 async def list_objects(
+    request: Request,
+    stream: bool = False,
+    fields: Optional[str] = None,
     model: Model = Depends(get_model),
+    page_params: PageParams = Depends(),
+    read_options: ReadOptions = Depends(),
     _ = Depends(auth_required)
 ):
     if not model:
@@ -51,13 +98,19 @@ async def list_objects(
     if "get" not in model._meta.default.allowed_operations:
         raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
 
-    collection = model.get_collection()
-    cursor = collection.find().sort([('_id', 1)])
-    return [model(**entry) for entry in await cursor.to_list(None)]
+    collection = read_options.get_collection(model)
+    projection = get_projection(model, fields)
+    if wants_stream(request, stream):
+        return stream_objects(collection, {}, page_params, model, projection)
+
+    page = await paginate(collection, {}, page_params, projection)
+    # returned as a response so that the documents skip `jsonable_encoder`
+    return FastPanelJSONResponse(model.dump_documents(page.documents, projection), headers=page.headers)
 
 
 @router.get("/models/objects/attributes")
 async def model_attributes(
+    request: Request,
     model: Model = Depends(get_model),
     _ = Depends(auth_required)
 ):
@@ -67,12 +120,114 @@ async def model_attributes(
     if "get" not in Model._meta.default.allowed_operations:
         raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
 
-    return model.dump_model_attributes()
+    return metadata.get_model_attributes_payload(model).to_response(request)
+
+
+@router.get("/models/objects/count")
+async def count(
+    exact: bool = False,
+    model: Model = Depends(get_model),
+    read_options: ReadOptions = Depends(),
+    _ = Depends(auth_required)
+):
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "get" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    return await count_objects(model, exact=exact, collection=read_options.get_collection(model))
+
+
+@router.post("/models/objects/count")
+async def count_search(
+    payload: schemas.SearchObject,
+    read_options: ReadOptions = Depends(),
+    _ = Depends(auth_required)
+):
+    model: Model = get_model(payload.app, payload.model)
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "get" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    try:
+        query = compile_search(model, payload.data)
+    except ValueError as e:
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+    return await count_objects(
+        model, query, exact=True,
+        collation=settings.SEARCH_COLLATION,
+        collection=read_options.get_collection(model)
+    )
+
+
+@router.get("/models/objects/export")
+async def export(
+    format: str = "ndjson",
+    partitions: Optional[int] = None,
+    model: Model = Depends(get_model),
+    _ = Depends(auth_required)
+):
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "get" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    if format not in EXPORT_FORMATS:
+        raise exceptions.HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            "format must be one of: %s" % (", ".join(EXPORT_FORMATS))
+        )
+
+    partitions = min(partitions or settings.EXPORT_PARTITIONS, settings.EXPORT_PARTITIONS)
+    filename = f"{model.get_collection_name()}.{format}"
+    return StreamingResponse(
+        export_objects(model, format, partitions),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/models/objects/stream")
+async def stream_changes(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    model: Model = Depends(get_model),
+    _ = Depends(auth_required)
+):
+    """
+    Sends the changes of the model's objects as server sent events, the clients
+    resume from the `Last-Event-ID` header, or the `last_event_id` query param
+    """
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "get" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    event_id = request.headers.get("last-event-id") or last_event_id
+    try:
+        subscription = await subscribe_to_changes(model, event_id)
+    except ValueError as e:
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    except PyMongoError as e:
+        raise exceptions.HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, f"Unable to watch the changes: {e}")
+
+    return StreamingResponse(
+        subscription.iter_events(),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/models/objects/{object_id}")
 async def retrieve_object(
     object_id: str, model: Model = Depends(get_model),
+    fields: Optional[str] = None,
     _ = Depends(auth_required),
 ):
     if not model:
@@ -82,16 +237,17 @@ async def retrieve_object(
         raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
 
     collection = model.get_collection()
+    projection = get_projection(model, fields)
 
     try:
-        db_obj = await collection.find_one({"_id": ObjectId(object_id)})
+        db_obj = await collection.find_one({"_id": ObjectId(object_id)}, projection)
     except Exception as e:
         raise exceptions.HTTPException(500, f"error: {e}")
     
     if db_obj is None:
         raise exceptions.HTTPException(404, "Object not found")
     
-    return model(**db_obj)
+    return model.dump_document(db_obj, projection)
 
 
 @router.post("/models/objects/")
@@ -110,6 +266,8 @@ async def create_objects(
     # if model._meta.default.is_nested:
     #     raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Model is nested! Permission deined")
 
+    if issubclass(model, FastPanelUser): await hash_password_field(payload.data)
+
     try:
         model_obj: Model = model(**payload.data)
     except ValidationError as e:
@@ -131,6 +289,229 @@ async def create_objects(
     return model(**dumped_data)
 
 
+def check_bulk_size(items: list):
+    if len(items) > settings.BULK_MAX_SIZE:
+        raise exceptions.HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"A maximum of {settings.BULK_MAX_SIZE} objects can be processed at once"
+        )
+
+
+def get_write_errors(e: BulkWriteError, positions: list) -> list:
+    """
+    Maps the write errors of a bulk operation back to the
+    position of the objects in the payload
+    """
+    return [
+        {
+            "index": positions[error["index"]],
+            "errors": [{"msg": error.get("errmsg"), "code": error.get("code")}]
+        } for error in e.details.get("writeErrors", [])
+    ]
+
+
+@router.post("/models/objects/bulk")
+async def bulk_create_objects(
+        payload: schemas.BulkCreateObjects,
+        _ = Depends(auth_required),
+    ):
+    model = get_model(payload.app, payload.model)
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "post" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    check_bulk_size(payload.data)
+    if issubclass(model, FastPanelUser):
+        await asyncio.gather(*(hash_password_field(data) for data in payload.data))
+
+    documents, positions, errors = [], [], []
+    for index, data in enumerate(payload.data):
+        try:
+            documents.append(model(**data).model_dump(dump_all=True))
+            positions.append(index)
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+
+    inserted_ids = []
+    if documents:
+        collection = model.get_collection()
+        try:
+            result = await collection.insert_many(documents, ordered=False)
+            inserted_ids = result.inserted_ids
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted_ids = [doc["_id"] for i, doc in enumerate(documents) if i not in failed]
+            errors.extend(get_write_errors(e, positions))
+        except Exception as e:
+            raise exceptions.HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={
+                    "msg": "Unable to insert data to db!",
+                    "error": str(e),
+                    "code": e.code if hasattr(e, "code") else None
+                }
+            )
+
+    return {
+        "inserted_ids": [str(_id) for _id in inserted_ids],
+        "errors": sorted(errors, key=lambda error: error["index"])
+    }
+
+
+@router.patch("/models/objects/bulk")
+async def bulk_update_objects(
+        payload: schemas.BulkUpdateObjects,
+        _ = Depends(auth_required),
+    ):
+    model = get_model(payload.app, payload.model)
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "update" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    check_bulk_size(payload.data)
+    is_user_model = issubclass(model, FastPanelUser)
+    if is_user_model:
+        await asyncio.gather(*(hash_password_field(item.data) for item in payload.data))
+
+    version_field = model._meta.default.version_field
+    items, errors = [], []
+    for index, item in enumerate(payload.data):
+        if not ObjectId.is_valid(item.id):
+            errors.append({"index": index, "errors": [{"msg": "Invalid object id"}]})
+            continue
+
+        if version_field and version_field in item.data:
+            errors.append({"index": index, "errors": [{"msg": f"'{version_field}' can't be updated"}]})
+            continue
+
+        items.append((index, ObjectId(item.id), item))
+
+    # the changes are validated along with the stored fields
+    collection = model.get_collection()
+    try:
+        cursor = collection.find({"_id": {"$in": [object_id for _, object_id, _ in items]}})
+        documents = {document["_id"]: document async for document in cursor} if items else {}
+    except Exception as e:
+        raise exceptions.HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "msg": "Unable to update the objects!",
+                "error": str(e),
+                "code": e.code if hasattr(e, "code") else None
+            }
+        )
+
+    operations, positions = [], []
+    for index, object_id, item in items:
+        stored = documents.get(object_id)
+        if stored is None:
+            errors.append({"index": index, "errors": [{"msg": "Object not found"}]})
+            continue
+
+        try:
+            changes = model.validate_changes(item.data, stored)
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+            continue
+
+        if not changes: continue
+        query, update = {"_id": object_id}, {"$set": changes}
+        if version_field:
+            # the object is written only if it's still the one which was validated
+            query[version_field] = stored.get(version_field)
+            update["$inc"] = {version_field: 1}
+        operations.append(UpdateOne(query, update))
+        positions.append(index)
+
+    matched_count = modified_count = 0
+    if operations:
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            matched_count, modified_count = result.matched_count, result.modified_count
+        except BulkWriteError as e:
+            matched_count = e.details.get("nMatched", 0)
+            modified_count = e.details.get("nModified", 0)
+            errors.extend(get_write_errors(e, positions))
+        except Exception as e:
+            raise exceptions.HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={
+                    "msg": "Unable to update the objects!",
+                    "error": str(e),
+                    "code": e.code if hasattr(e, "code") else None
+                }
+            )
+        finally:
+            if is_user_model:
+                for index in positions: invalidate_user(payload.data[index].id)
+
+    return {
+        "matched_count": matched_count,
+        "modified_count": modified_count,
+        "errors": sorted(errors, key=lambda error: error["index"])
+    }
+
+
+@router.delete("/models/objects/bulk")
+async def bulk_delete_objects(
+        payload: schemas.BulkDeleteObjects,
+        _ = Depends(auth_required),
+    ):
+    model = get_model(payload.app, payload.model)
+    if not model:
+        raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
+
+    if "delete" not in model._meta.default.allowed_operations:
+        raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
+
+    if bool(payload.ids) == bool(payload.filter):
+        raise exceptions.HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            "Pass either a non empty list of 'ids' or a non empty 'filter'"
+        )
+
+    errors, collation = [], None
+    if payload.ids:
+        check_bulk_size(payload.ids)
+        object_ids = []
+        for index, object_id in enumerate(payload.ids):
+            if ObjectId.is_valid(object_id): object_ids.append(ObjectId(object_id))
+            else: errors.append({"index": index, "errors": [{"msg": "Invalid object id"}]})
+        query = {"_id": {"$in": object_ids}}
+    else:
+        # the filter matches the same objects as the search with the same payload
+        try:
+            query = compile_search(model, payload.filter)
+        except ValueError as e:
+            raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+        collation = settings.SEARCH_COLLATION
+
+    collection = model.get_collection()
+    try:
+        result = await collection.delete_many(query, collation=collation)
+    except Exception as e:
+        raise exceptions.HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "msg": "Unable to delete the objects!",
+                "error": str(e),
+                "code": e.code if hasattr(e, "code") else None
+            }
+        )
+
+    if issubclass(model, FastPanelUser):
+        if payload.ids:
+            for object_id in payload.ids: invalidate_user(object_id)
+        else:
+            user_cache.clear()
+
+    return {"deleted_count": result.deleted_count, "errors": errors}
+
+
 @router.patch("/models/objects/{object_id}")
 async def update_object(
         object_id: str,
@@ -141,32 +522,55 @@ async def update_object(
     if not model:
         raise exceptions.HTTPException(status.HTTP_404_NOT_FOUND, "Model not found")
 
-    if "update" not in Model._meta.default.allowed_operations:
+    if "update" not in model._meta.default.allowed_operations:
         raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
 
+    if not ObjectId.is_valid(object_id):
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid object id")
+
+    version_field = model._meta.default.version_field
+    if version_field and version_field in payload.data:
+        raise exceptions.HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"'{version_field}' is managed by fastpanel and can't be updated"
+        )
+
+    if issubclass(model, FastPanelUser): await hash_password_field(payload.data)
+
     collection = model.get_collection()
+    projection = model.get_projection()
+    query = {"_id": ObjectId(object_id)}
+    if version_field and payload.version is not None:
+        query[version_field] = get_version_query(model, payload.version)
 
     try:
-        document = await collection.find_one({"_id": ObjectId(object_id)})
-        if not document:
-            raise exceptions.HTTPException(
-                status.HTTP_404_NOT_FOUND,
-                "Object not found"
-            )
+        stored = await collection.find_one(query)
+        if stored is None: raise await get_missing_error(collection, query)
 
+        # the changes are validated along with the stored fields
         try:
-            document = model(**document)
+            changes = model.validate_changes(payload.data, stored)
         except ValidationError as e:
             raise exceptions.HTTPException(422, {"count": e.error_count(), "errors": e.errors()})
 
-        for field_name in set(document.model_dump(True).keys()).intersection(payload.data.keys()):
-            setattr(document, field_name, payload.data[field_name])
+        # nothing changes, the object is only fetched
+        if not changes: return model.dump_document(stored, projection)
+
+        update = {"$set": changes}
+        if version_field:
+            # the object is written only if it's still the one which was validated
+            query[version_field] = stored.get(version_field)
+            update["$inc"] = {version_field: 1}
 
         document = await collection.find_one_and_update(
-            {"_id": ObjectId(object_id)},
-            {"$set": payload.data},
+            query, update,
+            projection=projection,
             return_document=ReturnDocument.AFTER
         )
+        if issubclass(model, FastPanelUser): invalidate_user(object_id)
+        if document is None: raise await get_missing_error(collection, query)
+    except exceptions.HTTPException:
+        raise
     except Exception as e:
         raise exceptions.HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -176,7 +580,8 @@ async def update_object(
                 "code": e.code if hasattr(e, "code") else None
             }
         )
-    return model(**document)
+
+    return model.dump_document(document, projection)
 
 
 @router.delete("/models/objects/{object_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -200,6 +605,7 @@ async def delete_object(
         db_collection = await collection.find_one_and_delete(
             {"_id": ObjectId(object_id)}
         )
+        if issubclass(model, FastPanelUser): invalidate_user(object_id)
     except Exception as e:
         raise exceptions.HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -233,6 +639,11 @@ async def get_search_fields(
 @router.post("/models/objects/search")
 async def search(
         payload: schemas.SearchObject,
+        request: Request,
+        stream: bool = False,
+        fields: Optional[str] = None,
+        page_params: PageParams = Depends(),
+        read_options: ReadOptions = Depends(),
         _ = Depends(auth_required)
     ):
     model: Model = get_model(payload.app, payload.model)
@@ -242,11 +653,32 @@ async def search(
     if "get" not in Model._meta.default.allowed_operations:
         raise exceptions.HTTPException(status.HTTP_403_FORBIDDEN, "Permission denied")
 
-    collection = model.get_collection()
+    try:
+        query = compile_search(model, payload.data)
+    except ValueError as e:
+        raise exceptions.HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+    collection = read_options.get_collection(model)
+    projection = get_projection(model, fields)
+    collation = settings.SEARCH_COLLATION
+
+    if wants_stream(request, stream):
+        return stream_objects(collection, query, page_params, model, projection, collation)
 
     try:
-        cursor = collection.find({**payload.data}).sort([("_id", 1)])
+        page = await paginate(collection, query, page_params, projection, collation)
     except Exception as e:
         raise exceptions.HTTPException(500, f"error: {e}")
 
-    return [Model(**entry) for entry in await cursor.to_list(None)]
+    # returned as a response so that the documents skip `jsonable_encoder`
+    return FastPanelJSONResponse(model.dump_documents(page.documents, projection), headers=page.headers)
+
+
+@router.get("/db/pool-stats")
+async def get_pool_stats(_ = Depends(auth_required)):
+    return pool_metrics.snapshot()
+
+
+@router.get("/db/slow-queries")
+async def get_slow_queries(_ = Depends(auth_required)):
+    return slow_queries.get_records()
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
 
 class CreateObject(BaseModel):
     data: dict
@@ -8,6 +10,7 @@ class CreateObject(BaseModel):
 
 class UpdateObject(BaseModel):
     data: dict
+    version: Optional[int] = None
     app: str = "fastpanel.core.accounts"
     model: str = "FastPanelUser"
 
@@ -16,3 +19,29 @@ class SearchObject(BaseModel):
     data: dict
     app: str = "fastpanel.core.accounts"
     model: str = "FastPanelUser"
+
+
+class BulkCreateObjects(BaseModel):
+    data: List[dict]
+    app: str = "fastpanel.core.accounts"
+    model: str = "FastPanelUser"
+
+
+class BulkUpdateItem(BaseModel):
+    id: str = Field(alias="_id")
+    data: dict
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class BulkUpdateObjects(BaseModel):
+    data: List[BulkUpdateItem]
+    app: str = "fastpanel.core.accounts"
+    model: str = "FastPanelUser"
+
+
+class BulkDeleteObjects(BaseModel):
+    ids: Optional[List[str]] = None
+    filter: Optional[dict] = None
+    app: str = "fastpanel.core.accounts"
+    model: str = "FastPanelUser"
@@ -0,0 +1,169 @@
+from datetime import datetime
+from decimal import Decimal
+import re
+
+from bson import Decimal128, ObjectId
+from pydantic import TypeAdapter, ValidationError
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from ..conf import settings
+
+
+RANGE_OPERATORS = {"gt": "$gt", "gte": "$gte", "lt": "$lt", "lte": "$lte"}
+
+TEXT_SEARCH_KEY = "$search"
+
+# adapters used for coercing the values of the search fields, by their bsonType
+TYPE_ADAPTERS = {
+    "date": TypeAdapter(datetime),
+    "timestamp": TypeAdapter(datetime),
+    "bool": TypeAdapter(bool),
+    "int": TypeAdapter(int),
+    "long": TypeAdapter(int),
+    "double": TypeAdapter(float),
+    "decimal": TypeAdapter(Decimal),
+    "number": TypeAdapter(float),
+}
+
+RANGE_TYPES = {"date", "timestamp", "int", "long", "double", "decimal", "number"}
+
+
+def get_bson_types(model, field_name: str) -> set:
+    field = model.model_fields[field_name]
+    bson_type = (field.json_schema_extra or {}).get("bsonType", "string")
+    bson_types = set(bson_type) if isinstance(bson_type, list) else {bson_type}
+    bson_types.discard("null")
+    return bson_types
+
+
+def get_search_fields(model) -> dict:
+    """
+    Maps the db names of the search fields of the model to their field names
+    """
+    field_names = {model.get_db_field_name(name): name for name in model.model_fields}
+    search_fields = {}
+    for field in model._meta.default.search_fields:
+        if field in field_names: search_fields[field] = field_names[field]
+        elif field in model.model_fields: search_fields[model.get_db_field_name(field)] = field
+    return search_fields
+
+
+def is_string_field(model, field_name: str) -> bool:
+    return "string" in get_bson_types(model, field_name)
+
+
+def coerce_value(model, field_name: str, value):
+    bson_types = get_bson_types(model, field_name)
+    if "objectId" in bson_types:
+        if not ObjectId.is_valid(value):
+            raise ValueError("'%s' is not a valid object id" % (value))
+        return ObjectId(value)
+
+    for bson_type in bson_types:
+        if bson_type in TYPE_ADAPTERS:
+            try:
+                value = TYPE_ADAPTERS[bson_type].validate_python(value)
+            except ValidationError:
+                raise ValueError("'%s' is not a valid %s" % (value, bson_type))
+            # compared as numbers by the server, a string never matches
+            if isinstance(value, Decimal): return Decimal128(value)
+            return value
+    return value
+
+
+def compile_predicate(model, db_field: str, field_name: str, value):
+    if isinstance(value, dict):
+        if not get_bson_types(model, field_name) & RANGE_TYPES:
+            raise ValueError("'%s' doesn't support ranges" % (db_field))
+
+        unknown_operators = set(value) - set(RANGE_OPERATORS)
+        if unknown_operators:
+            raise ValueError("Unknown operators: %s" % (", ".join(unknown_operators)))
+
+        return {
+            RANGE_OPERATORS[operator]: coerce_value(model, field_name, operand)
+            for operator, operand in value.items()
+        }
+
+    if isinstance(value, list):
+        return {"$in": [coerce_value(model, field_name, item) for item in value]}
+
+    if isinstance(value, str) and is_string_field(model, field_name):
+        # case insensitive prefix match, served by the collated search index
+        if not value: return {"$exists": True}
+        return {"$gte": value, "$lt": value + "\uffff"}
+
+    return coerce_value(model, field_name, value)
+
+
+def compile_search(model, data: dict) -> dict:
+    """
+    Compiles the search payload into a mongodb query which only
+    uses the `search_fields` of the model. Strings are matched by
+    their prefix ignoring the case, dicts with `gt`, `gte`, `lt` and
+    `lte` are compiled to ranges, and lists match any of their values.
+    Run the query with `settings.SEARCH_COLLATION`
+    raises `ValueError` if the payload can't be compiled
+    """
+    search_fields = get_search_fields(model)
+    query = {}
+    for key, value in data.items():
+        if key == TEXT_SEARCH_KEY:
+            if not model._meta.default.text_search:
+                raise ValueError("Text search isn't enabled for %s" % (model.get_model_name()))
+            query["$text"] = {"$search": str(value)}
+            continue
+
+        if key not in search_fields:
+            raise ValueError("'%s' is not a search field" % (key))
+        query[key] = compile_predicate(model, key, search_fields[key], value)
+    return query
+
+
+def get_search_index_name(db_field: str) -> str:
+    return "fastpanel_search_%s" % (re.sub(r"\W", "_", db_field))
+
+
+def is_indexed(model, db_field: str, collation: dict = None) -> bool:
+    """
+    Checks whether an index of `Meta.indexes` already serves the search queries
+    on the field, i.e. it starts with the field, isn't partial or sparse and has
+    the search collation if the field is a string
+    """
+    for index in model._meta.default.indexes:
+        keys = list(IndexModel(index["keys"]).document["key"].items())
+        field, direction = keys[0]
+        if field != db_field or direction not in (ASCENDING, DESCENDING): continue
+        if index.get("partialFilterExpression") or index.get("sparse"): continue
+        # the collation only matters for comparing strings
+        if collation is None or index.get("collation") == collation: return True
+    return False
+
+
+def get_search_indexes(model) -> list:
+    """
+    Indexes needed by the search queries of the model, string fields
+    are indexed with the search collation. The fields already indexed
+    by `Meta.indexes` are skipped, the server rejects an identical index
+    """
+    indexes, text_fields = [], []
+    for db_field, field_name in get_search_fields(model).items():
+        if db_field == "_id": continue
+
+        if is_string_field(model, field_name):
+            text_fields.append(db_field)
+            if is_indexed(model, db_field, settings.SEARCH_COLLATION): continue
+            indexes.append(IndexModel(
+                [(db_field, ASCENDING)],
+                name=get_search_index_name(db_field),
+                collation=settings.SEARCH_COLLATION
+            ))
+        elif not is_indexed(model, db_field):
+            indexes.append(IndexModel([(db_field, ASCENDING)], name=get_search_index_name(db_field)))
+
+    if model._meta.default.text_search and text_fields:
+        indexes.append(IndexModel(
+            [(field, TEXT) for field in text_fields],
+            name=get_search_index_name("text")
+        ))
+    return indexes
@@ -1,11 +1,83 @@
-from datetime import datetime, date
+from datetime import datetime, date, timezone
+from decimal import Decimal
 import json
 
-from bson import ObjectId, Timestamp
+from bson import Decimal128, ObjectId, Timestamp
+from pydantic import BaseModel
 from pydantic_core import PydanticUndefinedType
+import orjson
+
 from ..conf.settings import InstalledApp
 
 
+def encode_datetime(o: datetime) -> str:
+    # pydantic represents the utc offset as 'Z'
+    encoded = o.isoformat()
+    if encoded.endswith("+00:00"): return encoded[:-6] + "Z"
+    return encoded
+
+
+def get_timestamp_datetime(o: Timestamp) -> datetime:
+    # `Timestamp.as_datetime` uses a python tzinfo, which is a lot slower to encode
+    return datetime.fromtimestamp(o.time, timezone.utc)
+
+
+BSON_ENCODERS = {
+    ObjectId: str,
+    datetime: encode_datetime,
+    date: date.isoformat,
+    Timestamp: lambda o: encode_datetime(get_timestamp_datetime(o)),
+    Decimal128: str,
+    Decimal: str,
+}
+
+# datetimes are encoded by orjson itself, in the same format as `encode_datetime`
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# the types which orjson calls `encode_default` for, looked up by their exact type
+ORJSON_ENCODERS = {
+    ObjectId: str,
+    Timestamp: get_timestamp_datetime,
+    Decimal128: str,
+    Decimal: str,
+}
+
+JSON_TYPES = (str, int, float, bool, type(None))
+
+
+def encode_bson(value):
+    """
+    Converts a value read from the db into a json compatible value,
+    in the same format as pydantic's json mode
+    """
+    if type(value) in JSON_TYPES:
+        return value
+
+    encoder = BSON_ENCODERS.get(type(value))
+    if encoder:
+        return encoder(value)
+    if isinstance(value, dict):
+        return {key: encode_bson(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_bson(item) for item in value]
+    return value
+
+
+def encode_app(app: InstalledApp) -> dict:
+    return {
+        "app_name": app.app_name,
+        "models": [
+            {
+                "name": model.__name__,
+                "meta": {
+                    "is_nested": model._meta.default.is_nested,
+                    "search_fields": model._meta.default.search_fields
+                }
+            } for model in app.models
+        ]
+    }
+
+
 class FastPanelJSONEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, ObjectId):
@@ -17,16 +89,24 @@ class FastPanelJSONEncoder(json.JSONEncoder):
         if isinstance(o, PydanticUndefinedType):
             return None
         if isinstance(o, InstalledApp):
-            return {
-                "app_name": o.app_name,
-                "models": [
-                    {
-                        "name": model.__name__,
-                        "meta": {
-                            "is_nested": model._meta.default.is_nested,
-                            "search_fields": model._meta.default.search_fields
-                        }
-                    } for model in o.models
-                ]
-            }
+            return encode_app(o)
         return json.JSONEncoder.default(self, o)
+
+
+def encode_default(o):
+    """
+    Encodes the values which orjson doesn't support natively, the encoder
+    is looked up by the exact type first since it's the common case
+    """
+    encoder = ORJSON_ENCODERS.get(type(o))
+    if encoder: return encoder(o)
+    if isinstance(o, BaseModel): return o.model_dump(mode="json")
+    if isinstance(o, InstalledApp): return encode_app(o)
+    if isinstance(o, PydanticUndefinedType): return None
+    for type_, encoder in BSON_ENCODERS.items():
+        if isinstance(o, type_): return encoder(o)
+    raise TypeError("Object of type %s is not JSON serializable" % (type(o).__name__))
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
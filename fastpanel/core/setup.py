@@ -1,10 +1,11 @@
 import logging
+import sys
 from typing import List
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
+from . import metadata
+from .counting import count_cache
 from ..conf import settings
+from ..db.registry import registry
 from ..db.utils import Model, get_db_client
 
 
@@ -31,7 +32,8 @@ def load_cors_config(config):
             "allow_origins": ["*"],
             "allow_credentials": True,
             "allow_methods": ["*"],
-            "allow_headers": ["*"]
+            "allow_headers": ["*"],
+            "expose_headers": ["X-Next-Cursor", "X-Previous-Cursor"]
         }
 
 
@@ -63,38 +65,57 @@ class Setup:
         settings.INSTALLED_APPS.extend([
             settings.InstalledApp("fastpanel.core.accounts", "models"),
         ])
+        registry.load(settings.INSTALLED_APPS)
         settings.SECRET_KEY = secret_key
         settings.SETTINGS_LOADED = True
 
         # set database connection reference to Model
-        if not db_connection: db_connection = get_db_client()
+        if not db_connection:
+            # the mongodb commands are recorded only if the metrics are served
+            event_listeners = []
+            if settings.METRICS_ENABLED:
+                from .metrics import command_metrics
+                event_listeners.append(command_metrics)
+            db_connection = get_db_client(event_listeners)
         Model._conn = db_connection
 
+        # size the caches and hashing as per the loaded settings, the auth
+        # utils configure themselves when they are imported later on
+        count_cache.maxsize = settings.COUNT_CACHE_SIZE
+        count_cache.ttl = settings.COUNT_CACHE_TTL
+        auth_utils = sys.modules.get("fastpanel.core.auth.utils")
+        if auth_utils: auth_utils.configure()
+
+        metadata.load()
         return settings
 
     @staticmethod
-    async def load_models(connection):
+    async def load_models(connection, dry_run: bool = False):
+        from .install import install_models
+
+        # fail early on conflicting models
+        registry.load_all()
+
         db = getattr(connection, settings.DATABASE["name"])
-        models_available = await db.list_collection_names()
-        missing_models = [
-            req_model
+        models = [
+            model
             for app in settings.INSTALLED_APPS
-            for req_model in app.models
-            if req_model._meta.default.install_model and \
-               not req_model._meta.default.is_nested and \
-               not req_model.get_collection_name() in models_available
+            for model in app.models
+            if model._meta.default.install_model and not model._meta.default.is_nested
         ]
+        return await install_models(db, models, dry_run=dry_run)
 
-        for model in missing_models:
-            logger.info(f"installing {model.get_collection_name()} model...")
-            collection_name, validation_schema = model.get_bson_schema()
-            await db.create_collection(collection_name, validator=validation_schema)
-
-            for index in model._meta.default.indexes:
-                logger.info(f"adding index: {index}")
-                await db[collection_name].create_index(**index)
+    @staticmethod
+    def load_metadata():
+        # the cli computes the metadata lazily, only the server needs all of it
+        metadata.precompute()
 
     @staticmethod
-    async def load_middlewares(app: FastAPI):
+    async def load_middlewares(app: "FastAPI"):
+        from fastapi.middleware.cors import CORSMiddleware
         app.add_middleware(CORSMiddleware, **settings.CORS)
 
+        if settings.METRICS_ENABLED:
+            from .metrics import MetricsMiddleware
+            app.add_middleware(MetricsMiddleware)
+
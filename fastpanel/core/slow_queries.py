@@ -0,0 +1,130 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import json
+import logging
+
+from pymongo.errors import PyMongoError
+
+from ..conf import settings
+
+
+logger = logging.getLogger("uvicorn")
+
+# most recent slow queries, newest last, upto `settings.SLOW_QUERY_LOG_SIZE`
+records: deque = deque()
+
+# explains which are still running, at most `MAX_PENDING_EXPLAINS` run at a time
+_pending = set()
+
+MAX_PENDING_EXPLAINS = 4
+
+REDACTED = "?"
+
+
+def get_query_shape(query):
+    """
+    Replaces the values of the query with `?`, keeping the
+    field names and the operators
+    """
+    if isinstance(query, dict):
+        return {key: get_query_shape(value) for key, value in query.items()}
+    if isinstance(query, list) and query and all(isinstance(item, dict) for item in query):
+        # `$and`, `$or` and `$nor` hold queries
+        return [get_query_shape(item) for item in query]
+    return REDACTED
+
+
+def redact_plan(plan):
+    """
+    Removes the values of the query from the filters and the index bounds of the plan
+    """
+    if isinstance(plan, list): return [redact_plan(item) for item in plan]
+    if not isinstance(plan, dict): return plan
+
+    redacted = {}
+    for key, value in plan.items():
+        if key == "filter": redacted[key] = get_query_shape(value)
+        elif key == "indexBounds": redacted[key] = {field: REDACTED for field in value}
+        else: redacted[key] = redact_plan(value)
+    return redacted
+
+
+def get_plan_summary(plan: dict) -> str:
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if "keyPattern" in plan: stage += " " + json.dumps(plan["keyPattern"])
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def get_winning_plan(explain: dict) -> dict:
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # slot based engine nests the plan
+    return plan.get("queryPlan", plan)
+
+
+async def explain_query(record: dict, collection, query: dict, sort: list, projection: dict, collation: dict, limit: int):
+    try:
+        cursor = collection.find(query, projection, collation=collation).sort(sort).limit(limit)
+        explain = await cursor.explain()
+    except PyMongoError as e:
+        record["explain_error"] = str(e)
+    else:
+        stats = explain.get("executionStats", {})
+        plan = get_winning_plan(explain)
+        record.update({
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_returned": stats.get("nReturned"),
+            "plan_summary": get_plan_summary(plan),
+            "winning_plan": redact_plan(plan),
+        })
+
+    add_record(record)
+
+
+def add_record(record: dict):
+    records.append(record)
+    while len(records) > settings.SLOW_QUERY_LOG_SIZE: records.popleft()
+    logger.warning("slow query: %s" % (json.dumps(record, default=str)))
+
+
+def record_query(
+        collection, query: dict, sort: list, projection: Optional[dict],
+        collation: Optional[dict], limit: int, duration: float
+    ):
+    """
+    Records the query if it took longer than `settings.SLOW_QUERY_MS`, the
+    query is explained in the background so that the request isn't delayed
+    """
+    if not settings.SLOW_QUERY_MS or duration * 1000 < settings.SLOW_QUERY_MS:
+        return
+
+    from ..db.utils import get_model_via_collection_name
+    model = get_model_via_collection_name(collection.name)
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "model": model.get_model_name() if model else None,
+        "collection": collection.name,
+        "filter": get_query_shape(query),
+        "sort": sort,
+        "projection": projection,
+        "duration_ms": round(duration * 1000, 1),
+    }
+
+    if len(_pending) >= MAX_PENDING_EXPLAINS:
+        record["explain_error"] = "Skipped, too many slow queries are being explained"
+        return add_record(record)
+
+    task = asyncio.create_task(explain_query(record, collection, query, sort, projection, collation, limit))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+def get_records() -> List[dict]:
+    return list(reversed(records))
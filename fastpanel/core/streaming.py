@@ -0,0 +1,40 @@
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .pagination import PageParams
+from ..conf import settings
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    """
+    Checks whether the client asked for a streamed response,
+    either with the `stream` query flag or with the `Accept` header
+    """
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def iter_ndjson(cursor, model, projection: dict = None) -> AsyncIterator[bytes]:
+    async for entry in cursor:
+        yield model.dump_document_json(entry, projection).encode() + b"\n"
+
+
+def stream_objects(
+        collection, query: dict, params: PageParams,
+        model, projection: dict = None, collation: dict = None
+    ) -> StreamingResponse:
+    """
+    Streams every document matching the query as newline delimited json,
+    documents are pulled from the db in batches of `settings.STREAM_BATCH_SIZE`
+    so the memory used stays the same irrespective of the size of the result
+    """
+    cursor = collection.find(params.get_query(query), projection, collation=collation) \
+        .sort([("_id", 1)]) \
+        .batch_size(settings.STREAM_BATCH_SIZE)
+
+    if params.requested_limit: cursor = cursor.limit(params.requested_limit)
+    return StreamingResponse(iter_ndjson(cursor, model, projection), media_type=NDJSON_MEDIA_TYPE)
@@ -1,2 +1,3 @@
 from .models import Model
+from .registry import registry
 from .utils import get_model
\ No newline at end of file
@@ -0,0 +1,64 @@
+from typing import Optional, Union
+
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+READ_CONCERNS = ("local", "available", "majority", "linearizable", "snapshot")
+
+
+def get_read_preference(value: Union[str, dict, None], max_staleness: Optional[int] = None):
+    """
+    Builds a read preference from its mode, ex. `"secondaryPreferred"`,
+    or a dict with the `mode` along with `max_staleness` and `tag_sets`
+    raises `ValueError` if the read preference is invalid
+    """
+    if value is None: return None
+
+    options = dict(value) if isinstance(value, dict) else {"mode": value}
+    mode = options.pop("mode", None)
+    if mode not in READ_PREFERENCES:
+        raise ValueError("Unknown read preference: %s" % (mode))
+
+    if max_staleness is not None: options["max_staleness"] = max_staleness
+    if mode == "primary":
+        if options: raise ValueError("The primary read preference doesn't take any options")
+        return Primary()
+
+    unknown_options = set(options) - {"max_staleness", "tag_sets", "hedge"}
+    if unknown_options:
+        raise ValueError("Unknown read preference options: %s" % (", ".join(unknown_options)))
+
+    try:
+        return READ_PREFERENCES[mode](**options)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid read preference: %s" % (e))
+
+
+def get_read_concern(value: Optional[str]):
+    if value is None: return None
+    if value not in READ_CONCERNS:
+        raise ValueError("Unknown read concern: %s" % (value))
+    return ReadConcern(value)
+
+
+def get_write_concern(value: Union[dict, str, int, None]):
+    """
+    Builds a write concern from its `w`, or a dict with `w`, `j` and `wtimeout`
+    raises `ValueError` if the write concern is invalid
+    """
+    if value is None: return None
+    options = dict(value) if isinstance(value, dict) else {"w": value}
+    try:
+        return WriteConcern(**options)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid write concern: %s" % (e))
@@ -1,11 +1,15 @@
 import json
 from abc import ABC
+from typing import Iterable, List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic._internal._model_construction import ModelMetaclass
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticCustomError, ValidationError
 
-from ..core.serializers import FastPanelJSONEncoder
+from ..core.serializers import FastPanelJSONEncoder, dumps, encode_bson
 from .annotations import PyObjectId, ObjectId
+from .concerns import get_read_concern, get_read_preference, get_write_concern
 
 
 class MetaOptions:
@@ -19,6 +23,12 @@ class MetaOptions:
         hidden_fields=[],
         is_nested=False,
         install_model=True,
+        trusted_reads=False,
+        text_search=False,
+        version_field=None,
+        read_preference=None,
+        read_concern=None,
+        write_concern=None,
         **options
     ):
         self.parent = parent
@@ -29,6 +39,12 @@ class MetaOptions:
         self.search_fields = search_fields
         self.is_nested = is_nested
         self.install_model = install_model
+        self.trusted_reads = trusted_reads
+        self.text_search = text_search
+        self.version_field = version_field
+        self.read_preference = get_read_preference(read_preference)
+        self.read_concern = get_read_concern(read_concern)
+        self.write_concern = get_write_concern(write_concern)
     
     def __repr__(self) -> str:
         return "<MetaOptions parent='%s' is_nested='%s'>" % (self.parent, self.is_nested)
@@ -66,9 +82,17 @@ class Model(ABC, BaseModel, metaclass=MetaModel):
         return cls.__name__.lower() + "s"
 
     @classmethod
-    def _get_model_attrs(cls, raw_schema: dict, is_internal=True):
+    def _get_model_attrs(cls, raw_schema: dict, is_internal=True, _parents: tuple = ()):
         from .utils import get_model_via_collection_name
         default_description = lambda field_name, type: "\'%s\' must be an \'%s\'" % (field_name, type)
+        parents = _parents + (cls,)
+
+        def get_related_attrs(related_model):
+            # a model embedded inside itself can't be expanded any further
+            if related_model in parents:
+                return {"bsonType": "object", "title": related_model.__name__}
+            return related_model._get_model_attrs(related_model.model_json_schema(), is_internal, parents)
+
         attrs = {}
         schema = {"bsonType": "object", "title": raw_schema["title"].strip()}
 
@@ -91,7 +115,7 @@ class Model(ABC, BaseModel, metaclass=MetaModel):
                     "bsonType": value["bsonType"],
                     "title": value["title"].strip(),
                     "description": value.get("description", default_description(key, value["bsonType"])),
-                    "items": related_model._get_model_attrs(related_model.model_json_schema(), is_internal)
+                    "items": get_related_attrs(related_model)
                 }
 
             elif value["bsonType"] == "object":
@@ -99,7 +123,7 @@ class Model(ABC, BaseModel, metaclass=MetaModel):
                 related_model = get_model_via_collection_name(related_to)
 
                 attrs[key] = {
-                    **related_model._get_model_attrs(related_model.model_json_schema(), is_internal),
+                    **get_related_attrs(related_model),
                     "description": value.get("description", default_description(key, value["bsonType"]))
                 }
 
@@ -140,16 +164,176 @@ class Model(ABC, BaseModel, metaclass=MetaModel):
         return cls.__name__
     
     @classmethod
-    def get_collection(cls):
+    def get_collection(cls, read_preference=None, read_concern=None, write_concern=None):
         """
-        Get the mongodb collection attached with this model
+        Get the mongodb collection attached with this model, configured with
+        the read preference, read concern and write concern of the `Meta`.
+        The passed ones take precedence over the ones of the `Meta`
         raises error `SettingsNotLoaded` if called before loading settings
         """
         from ..conf import settings
         from ..exceptions import SettingsNotLoaded
 
         if not settings.SETTINGS_LOADED: raise SettingsNotLoaded
-        return cls._conn[settings.DATABASE.get("name")][cls.get_collection_name()]
+        collection = cls._conn[settings.DATABASE.get("name")][cls.get_collection_name()]
+
+        meta = cls._meta.default
+        options = {
+            "read_preference": read_preference or meta.read_preference,
+            "read_concern": read_concern or meta.read_concern,
+            "write_concern": write_concern or meta.write_concern,
+        }
+        options = {key: value for key, value in options.items() if value is not None}
+        return collection.with_options(**options) if options else collection
+
+    @classmethod
+    def get_db_field_name(cls, field_name: str) -> str:
+        field = cls.model_fields[field_name]
+        return field.alias or field_name
+
+    @classmethod
+    def get_projection(cls, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """
+        Builds the mongodb projection for fetching the documents of this model,
+        the hidden fields are never fetched
+        :param fields: fetch only these fields, `_id` is always fetched
+        raises `ValueError` if any of the fields is not present on the model
+        """
+        hidden_fields = {cls.get_db_field_name(field) for field in cls._meta.default.hidden_fields}
+        if not fields:
+            return {field: 0 for field in hidden_fields} or None
+
+        db_fields = {cls.get_db_field_name(name): name for name in cls.model_fields}
+        field_names = {name: db_field for db_field, name in db_fields.items()}
+        unknown_fields = [field for field in fields if field not in db_fields and field not in field_names]
+        if unknown_fields:
+            raise ValueError("Unknown fields: %s" % (", ".join(unknown_fields)))
+
+        projection = {"_id": 1}
+        for field in fields:
+            db_field = field if field in db_fields else field_names[field]
+            if db_field not in hidden_fields: projection[db_field] = 1
+        return projection
+
+    @classmethod
+    def _get_partial_model(cls):
+        """
+        Creates a copy of this model where every field is optional,
+        used for validating the documents fetched with a projection
+        """
+        if "_partial_model" in cls.__dict__:
+            return cls._partial_model
+
+        namespace = {"__module__": cls.__module__, "__qualname__": cls.__qualname__, "__annotations__": {}}
+        for name, field in cls.model_fields.items():
+            if not field.is_required(): continue
+            namespace["__annotations__"][name] = Optional[field.annotation]
+            namespace[name] = FieldInfo.merge_field_infos(field, default=None)
+
+        meta_class = cls.__dict__.get("Meta", None)
+        if meta_class: namespace["Meta"] = meta_class
+
+        cls._partial_model = MetaModel(cls.__name__, (cls,), namespace)
+        return cls._partial_model
+
+    @classmethod
+    def from_db(cls, document: dict, projection: Optional[dict] = None) -> "Model":
+        """
+        Builds the model from a document fetched using the `projection`,
+        only the fields present in the document are validated. Dump it with
+        `exclude_unset=True` to skip the fields which weren't fetched
+        """
+        if not projection: return cls(**document)
+        return cls._get_partial_model()(**document)
+
+    @classmethod
+    def validate_changes(cls, data: dict, document: dict) -> dict:
+        """
+        Validates the stored `document` with the changes applied, so that the model
+        validators see every field. `_id` and the frozen fields can't be updated.
+        Returns the validated values of the changed fields keyed by their db field names
+        raises `ValidationError` if the changes or the updated document are invalid
+        """
+        field_names = {cls.get_db_field_name(name): name for name in cls.model_fields}
+        line_errors, changes, changed = [], {}, set()
+        for key, value in data.items():
+            name = key if key in cls.model_fields else field_names.get(key)
+            if name is None:
+                line_errors.append({"type": "extra_forbidden", "loc": (key,), "input": value})
+            elif name == "id" or cls.model_fields[name].frozen:
+                line_errors.append({"type": "frozen_field", "loc": (key,), "input": value})
+            else:
+                changes[cls.get_db_field_name(name)] = value
+                changed.add(name)
+
+        if line_errors:
+            raise ValidationError.from_exception_data(cls.__name__, line_errors)
+
+        try:
+            obj = cls(**{**document, **changes})
+        except ValidationError as e:
+            # reported against the payload, the stored values aren't sent back
+            line_errors = e.errors(include_url=False)
+        except Exception as e:
+            # the validators are expected to raise `ValueError`, report the rest the same way
+            line_errors = [{"type": "value_error", "loc": (), "msg": "Value error, %s" % (e)}]
+
+        if line_errors:
+            raise ValidationError.from_exception_data(cls.__name__, [{
+                "type": PydanticCustomError(error["type"], error["msg"]),
+                "loc": error["loc"],
+                "input": data.get(error["loc"][0], data) if error["loc"] else data,
+            } for error in line_errors])
+        return obj.model_dump(dump_all=True, include=changed)
+
+    @classmethod
+    def _get_hidden_db_fields(cls) -> frozenset:
+        if "_hidden_db_fields" not in cls.__dict__:
+            cls._hidden_db_fields = frozenset(
+                cls.get_db_field_name(field) for field in cls._meta.default.hidden_fields
+            )
+        return cls._hidden_db_fields
+
+    @classmethod
+    def dump_document(cls, document: dict, projection: Optional[dict] = None) -> dict:
+        """
+        Dumps a document fetched from the db in the same format as `model_dump(mode="json")`.
+        If `Meta.trusted_reads` is set, the document is trusted to match the schema
+        enforced by the collection validator, and is encoded as it is without validation
+        """
+        if cls._meta.default.trusted_reads:
+            hidden_fields = cls._get_hidden_db_fields()
+            return {
+                key: encode_bson(value)
+                for key, value in document.items() if key not in hidden_fields
+            }
+
+        obj = cls.from_db(document, projection)
+        return obj.model_dump(mode="json", exclude_unset=projection is not None)
+
+    @classmethod
+    def dump_documents(cls, documents: List[dict], projection: Optional[dict] = None) -> List[dict]:
+        """
+        Dumps the documents of a page for `FastPanelJSONResponse`, with `Meta.trusted_reads`
+        only the hidden fields are removed and the bson values are left to the encoder
+        """
+        if not cls._meta.default.trusted_reads:
+            return [cls.dump_document(document, projection) for document in documents]
+
+        hidden_fields = cls._get_hidden_db_fields()
+        if not hidden_fields: return documents
+        return [
+            {key: value for key, value in document.items() if key not in hidden_fields}
+            for document in documents
+        ]
+
+    @classmethod
+    def dump_document_json(cls, document: dict, projection: Optional[dict] = None) -> str:
+        if cls._meta.default.trusted_reads:
+            return dumps(cls.dump_documents([document], projection)[0]).decode()
+
+        obj = cls.from_db(document, projection)
+        return obj.model_dump_json(exclude_unset=projection is not None)
 
     @classmethod
     def dump_model_attributes(cls):
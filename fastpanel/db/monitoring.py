@@ -0,0 +1,88 @@
+from collections import defaultdict
+from threading import Lock
+
+from pymongo import monitoring
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.cleared = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "wait_time_avg_ms": self.wait_time_total / max(self.checkouts, 1) * 1000,
+            "wait_time_max_ms": self.wait_time_max * 1000,
+            "cleared": self.cleared,
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Keeps the connection counts and the checkout wait times of the
+    connection pools, per server
+    """
+
+    def __init__(self) -> None:
+        self.pools = defaultdict(PoolStats)
+        self._lock = Lock()
+
+    def record_wait(self, stats: PoolStats, event):
+        duration = event.duration
+        stats.wait_time_total += duration
+        stats.wait_time_max = max(stats.wait_time_max, duration)
+
+    def pool_created(self, event): pass
+
+    def pool_ready(self, event): pass
+
+    def pool_cleared(self, event):
+        with self._lock: self.pools[event.address].cleared += 1
+
+    def pool_closed(self, event):
+        with self._lock: self.pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        with self._lock: self.pools[event.address].open += 1
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event):
+        with self._lock: self.pools[event.address].open -= 1
+
+    def connection_check_out_started(self, event): pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self.pools[event.address]
+            stats.checkout_failures += 1
+            self.record_wait(stats, event)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            stats = self.pools[event.address]
+            stats.checked_out += 1
+            stats.checkouts += 1
+            self.record_wait(stats, event)
+
+    def connection_checked_in(self, event):
+        with self._lock: self.pools[event.address].checked_out -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "%s:%s" % (address): stats.to_dict()
+                for address, stats in self.pools.items()
+            }
+
+
+pool_metrics = PoolMetrics()
@@ -0,0 +1,90 @@
+import logging
+from typing import Dict, Iterable, Optional, Set, Tuple, Type
+
+from .models import Model
+
+
+logger = logging.getLogger("uvicorn")
+
+
+class ModelRegistry:
+    """
+    Keeps the models of the installed apps indexed by their app and name,
+    collection name and class, so that they can be looked up in constant time.
+    Model names are matched case insensitively. The models of an app are
+    imported on the first lookup which needs them
+    """
+
+    def __init__(self) -> None:
+        self.by_name: Dict[Tuple[str, str], Type[Model]] = {}
+        self.by_collection: Dict[str, Type[Model]] = {}
+        self.by_class: Dict[Type[Model], str] = {}
+        self.apps: Dict[str, object] = {}
+        self.loaded_apps: Set[str] = set()
+        self.complete = False
+
+    def clear(self):
+        self.by_name.clear()
+        self.by_collection.clear()
+        self.by_class.clear()
+        self.loaded_apps.clear()
+        self.complete = False
+
+    def register(self, app_name: str, model: Type[Model]):
+        key = (app_name, model.get_model_name().lower())
+        if key in self.by_name and self.by_name[key] is not model:
+            raise ValueError(
+                "Conflicting models: '%s' is defined more than once in app '%s'"
+                % (model.get_model_name(), app_name)
+            )
+
+        collection_name = model.get_collection_name()
+        registered = self.by_collection.get(collection_name)
+        if registered is not None and registered is not model:
+            logger.warning(
+                f"{model.get_model_name()} of {app_name} refers to the collection "
+                f"'{collection_name}' of {registered.get_model_name()}, "
+                f"lookups by collection name will resolve to {registered.get_model_name()}"
+            )
+        else:
+            self.by_collection[collection_name] = model
+
+        self.by_name[key] = model
+        self.by_class[model] = app_name
+
+    def load(self, installed_apps: Iterable):
+        """
+        Registers the installed apps, their models are registered lazily
+        """
+        self.clear()
+        self.apps = {app.app_name: app for app in installed_apps}
+
+    def load_app(self, app_name: str):
+        if app_name in self.loaded_apps or app_name not in self.apps: return
+        for model in self.apps[app_name].models:
+            self.register(app_name, model)
+        self.loaded_apps.add(app_name)
+
+    def load_all(self):
+        if self.complete: return
+        # start over, so that the models sharing a collection
+        # resolve to the same model as they would when loaded in order
+        if self.loaded_apps: self.clear()
+        for app_name in self.apps:
+            self.load_app(app_name)
+        self.complete = True
+
+    def get(self, app_name: str, model_name: str) -> Optional[Type[Model]]:
+        self.load_app(app_name)
+        return self.by_name.get((app_name, model_name.lower()))
+
+    def get_by_collection(self, collection_name: str) -> Optional[Type[Model]]:
+        self.load_all()
+        return self.by_collection.get(collection_name)
+
+    def get_app_name(self, model: Type[Model]) -> Optional[str]:
+        if model not in self.by_class: self.load_all()
+        return self.by_class.get(model)
+
+
+registry = ModelRegistry()
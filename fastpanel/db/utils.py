@@ -1,8 +1,11 @@
+from typing import Iterable
+import asyncio
 import inspect
-
-from motor.motor_asyncio import AsyncIOMotorClient
+from urllib.parse import quote_plus
 
 from .models import Model
+from .monitoring import pool_metrics
+from .registry import registry
 
 
 def find_models(module, app_name):
@@ -16,16 +19,50 @@ def find_models(module, app_name):
     )
 
 
+# keys of the `database` section which make up the url, the rest are passed to the client
+DATABASE_URL_KEYS = ("name", "url", "host", "port", "user", "password", "srv")
+
+DEFAULT_CLIENT_OPTIONS = {
+    "serverSelectionTimeoutMS": 60000,
+    "retryWrites": True,
+    "w": "majority",
+}
+
+
 def get_db_url():
+    """
+    Builds the connection url from the `database` section of the config,
+    a full `url` takes precedence. Hosts are looked up as `mongodb+srv`
+    unless `srv: false` is passed
+    """
     from ..conf import settings
-    return "mongodb+srv://{}:{}@{}/?retryWrites=true&w=majority".format(
-        settings.DATABASE['user'],
-        settings.DATABASE['password'],
-        settings.DATABASE['host']
-    )
+    database = settings.DATABASE
+    if database.get("url"): return database["url"]
+
+    credentials = ""
+    if database.get("user"):
+        credentials = "%s:%s@" % (quote_plus(str(database["user"])), quote_plus(str(database.get("password", ""))))
+
+    if database.get("srv", True):
+        return "mongodb+srv://%s%s/" % (credentials, database["host"])
+
+    host = database["host"]
+    if database.get("port"): host = "%s:%s" % (host, database["port"])
+    return "mongodb://%s%s/" % (credentials, host)
+
+
+def get_client_options() -> dict:
+    from ..conf import settings
+    options = dict(DEFAULT_CLIENT_OPTIONS)
+    options.update({
+        key: value for key, value in settings.DATABASE.items()
+        if key not in DATABASE_URL_KEYS
+    })
+    return options
 
 
-def get_db_client():
+def get_db_client(event_listeners: Iterable = ()):
+    from motor.motor_asyncio import AsyncIOMotorClient
     from ..conf import settings
     if not settings.DATABASE:
         raise TypeError(
@@ -33,27 +70,29 @@ def get_db_client():
             "the database info in the config file"
         )
 
-    return AsyncIOMotorClient(get_db_url(), serverSelectionTimeoutMS=60000)
+    return AsyncIOMotorClient(
+        get_db_url(),
+        event_listeners=[pool_metrics, *event_listeners],
+        **get_client_options()
+    )
 
 
-def get_model(app_name: str = "fastpanel.core.accounts", model_name: str = "FastPanelUser") -> Model:
+async def warmup_pool(connection):
+    """
+    Opens the connections upto the `minPoolSize` of the client
+    upfront, instead of on the first requests
+    """
     from ..conf import settings
-    try:
-        app: settings.InstalledApp = list(filter(lambda x: x.app_name == app_name, settings.INSTALLED_APPS))[0]
-        for model in app.models:
-            if model.__name__.lower().endswith(model_name.lower()):
-                return model
-    except IndexError: pass
-    return None
+    size = connection.options.pool_options.min_pool_size
+    if not size: return
+
+    db = getattr(connection, settings.DATABASE["name"])
+    await asyncio.gather(*(db.command("ping") for _ in range(size)))
+
+
+def get_model(app_name: str = "fastpanel.core.accounts", model_name: str = "FastPanelUser") -> Model:
+    return registry.get(app_name, model_name)
 
 
 def get_model_via_collection_name(collection_name: str):
-    from ..conf import settings
-    def search(installed_app: settings.InstalledApp):
-        model = next(filter(lambda x: x.get_collection_name() == collection_name, installed_app.models), None)
-        return model
-
-    try:
-        return next(map(search, settings.INSTALLED_APPS), None)
-    except StopIteration: pass
-    return None
+    return registry.get_by_collection(collection_name)
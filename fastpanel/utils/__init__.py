@@ -1 +1 @@
-from .helpers import parse_config_file, setup_frontend
\ No newline at end of file
+from .helpers import parse_config_file
\ No newline at end of file
@@ -0,0 +1,317 @@
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Optional
+import gzip
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MANIFEST_NAME = "manifest.json"
+
+# files which are served under their own name, everything else gets a content hash
+ENTRY_POINTS = {"index.html"}
+
+TEXT_SUFFIXES = {".html", ".js", ".css", ".svg", ".json", ".txt", ".map"}
+
+# files which are rewritten, since they can refer to the other assets
+REFERRING_SUFFIXES = {".html", ".js", ".css"}
+
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# placeholders of the compiled frontend code, replaced while building it
+PLACEHOLDERS = {
+    "<FP_BASE_APP_URL>": "/fastpanel",
+    "<FP_BASE_API_URL>": "http://localhost:8000/fastpanel",
+}
+
+
+def get_hashed_name(path: str, content: bytes) -> str:
+    stem, dot, suffix = path.rpartition(".")
+    if not dot: return "%s.%s" % (path, sha256(content).hexdigest()[:10])
+    return "%s.%s.%s" % (stem, sha256(content).hexdigest()[:10], suffix)
+
+
+def get_fingerprint(frontend_dir: Path) -> str:
+    fingerprint = sha256(json.dumps(PLACEHOLDERS, sort_keys=True).encode())
+    for path in sorted(frontend_dir.glob("**/*")):
+        if not path.is_file(): continue
+        fingerprint.update(path.relative_to(frontend_dir).as_posix().encode())
+        fingerprint.update(path.read_bytes())
+    return fingerprint.hexdigest()
+
+
+def get_reference_pattern(source: str, target: str) -> re.Pattern:
+    """
+    Matches the quoted references to `target` inside `source`,
+    either from the root or relative to the directory of `source`
+    """
+    relative = os.path.relpath(target, os.path.dirname(source) or ".").replace(os.sep, "/")
+    candidates = ["/" + target, "./" + relative]
+    return re.compile(
+        r"(?<=[\"'(])(%s)(?=[\"')?#])" % ("|".join(re.escape(candidate) for candidate in candidates))
+    )
+
+
+def compress(content: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    # only keep the variants which are worth it
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def build_frontend(frontend_dir: Path, build_dir: Path) -> dict:
+    """
+    Writes the assets of the frontend to `build_dir` under content hashed
+    names, rewriting the references between them, along with their `.gz`
+    and `.br` variants. Returns the manifest of the build
+    """
+    files = {
+        path.relative_to(frontend_dir).as_posix(): path.read_bytes()
+        for path in frontend_dir.glob("**/*") if path.is_file()
+    }
+    for name, content in files.items():
+        if not name.endswith(".js"): continue
+        text = content.decode()
+        for placeholder, value in PLACEHOLDERS.items(): text = text.replace(placeholder, value)
+        files[name] = text.encode()
+
+    # an asset is hashed once the assets which it refers to are hashed
+    references = {}
+    for name, content in files.items():
+        references[name] = set()
+        if Path(name).suffix not in REFERRING_SUFFIXES: continue
+        text = content.decode()
+        references[name] = {
+            target for target in files
+            if target != name and get_reference_pattern(name, target).search(text)
+        }
+
+    assets, pending = {}, set(files)
+    while pending:
+        ready = [name for name in pending if not references[name] & pending]
+        if not ready:
+            raise ValueError("Circular references between: %s" % (", ".join(sorted(pending))))
+
+        for name in sorted(ready):
+            content = files[name]
+            if references[name]:
+                text = content.decode()
+                for target in references[name]:
+                    # the hashed name only differs in the file name
+                    file_name = target.rsplit("/", 1)[-1]
+                    hashed_file_name = assets[target]["path"].rsplit("/", 1)[-1]
+                    text = get_reference_pattern(name, target).sub(
+                        lambda match: match.group(1)[:-len(file_name)] + hashed_file_name, text
+                    )
+                content = text.encode()
+
+            immutable = Path(name).name not in ENTRY_POINTS
+            path = get_hashed_name(name, content) if immutable else name
+            destination = build_dir / path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            destination.write_bytes(content)
+
+            encodings = []
+            if Path(name).suffix in TEXT_SUFFIXES:
+                for encoding, data in compress(content).items():
+                    destination.with_name(destination.name + ENCODINGS[encoding]).write_bytes(data)
+                    encodings.append(encoding)
+
+            assets[name] = {
+                "path": path,
+                "etag": sha256(content).hexdigest()[:32],
+                "size": len(content),
+                "immutable": immutable,
+                "encodings": encodings,
+            }
+        pending.difference_update(ready)
+
+    return {"fingerprint": get_fingerprint(frontend_dir), "assets": assets}
+
+
+def load_manifest(build_dir: Path) -> Optional[dict]:
+    try:
+        return json.loads((build_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def setup_frontend(frontend_dir: Path) -> Path:
+    """
+    Builds the frontend once into a directory named after its fingerprint,
+    under the `static` directory next to it. It's built again whenever
+    the sources change and the older builds are removed
+    """
+    frontend_dir = Path(frontend_dir)
+    builds_dir = frontend_dir.parent / "static"
+    fingerprint = get_fingerprint(frontend_dir)
+    build_dir = builds_dir / fingerprint[:16]
+
+    manifest = load_manifest(build_dir)
+    if manifest and manifest.get("fingerprint") == fingerprint:
+        return build_dir
+
+    # a build only appears under its final name once it's complete, the rename
+    # is atomic so the workers starting together never see a partial build
+    tmp_dir = builds_dir / (".tmp.%s" % (os.getpid()))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    manifest = build_frontend(frontend_dir, tmp_dir)
+    (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+    try:
+        tmp_dir.rename(build_dir)
+    except OSError:
+        # another worker has finished the same build first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for path in builds_dir.iterdir():
+        if path.name == build_dir.name or path.name.startswith(".tmp."): continue
+        if path.is_dir(): shutil.rmtree(path, ignore_errors=True)
+        else: path.unlink(missing_ok=True)
+    return build_dir
+
+
+def get_media_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def get_accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0: continue
+            except ValueError:
+                continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticAsset:
+    """
+    A built asset along with its compressed variants, the assets
+    smaller than `settings.STATIC_MEMORY_MAX_SIZE` are kept in memory
+    """
+
+    def __init__(self, build_dir: Path, info: dict, immutable: bool, memory_max_size: int) -> None:
+        from ..conf import settings
+
+        self.path = build_dir / info["path"]
+        self.media_type = get_media_type(info["path"])
+        self.cache_control = "public, max-age=%s, immutable" % (settings.STATIC_MAX_AGE) \
+            if immutable else "no-cache"
+
+        # best encoding first, identity is always available
+        self.variants = {
+            encoding: self.path.with_name(self.path.name + ENCODINGS[encoding])
+            for encoding in ENCODINGS if encoding in info["encodings"]
+        }
+        self.variants[None] = self.path
+        # each variant is a different representation, with an etag of its own
+        self.etags = {
+            encoding: '"%s-%s"' % (info["etag"], encoding) if encoding else '"%s"' % (info["etag"])
+            for encoding in self.variants
+        }
+        self.content = {
+            encoding: path.read_bytes()
+            for encoding, path in self.variants.items()
+            if path.stat().st_size <= memory_max_size
+        }
+
+    def get_encoding(self, headers: Headers) -> Optional[str]:
+        accepted = get_accepted_encodings(headers.get("accept-encoding", ""))
+        for encoding in self.variants:
+            if encoding is None or encoding in accepted: return encoding
+        return None
+
+    def is_fresh(self, headers: Headers, etag: str) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if not if_none_match: return False
+        for value in if_none_match.split(","):
+            value = value.strip()
+            if value.startswith("W/"): value = value[2:]
+            if value in ("*", etag): return True
+        return False
+
+    def get_response(self, scope: Scope) -> Response:
+        headers = Headers(scope=scope)
+        encoding = self.get_encoding(headers)
+        response_headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if self.is_fresh(headers, self.etags[encoding]):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding: response_headers["Content-Encoding"] = encoding
+
+        if encoding in self.content:
+            content = self.content[encoding]
+            if scope["method"] == "HEAD":
+                response_headers["Content-Length"] = str(len(content))
+                content = b""
+            return Response(content, media_type=self.media_type, headers=response_headers)
+
+        return FileResponse(
+            self.variants[encoding],
+            media_type=self.media_type,
+            headers=response_headers,
+            method=scope["method"]
+        )
+
+
+class FrontendFiles:
+    """
+    Serves a build of `setup_frontend`, the content hashed assets are
+    cached for good by the browsers while the entry points are revalidated.
+    The assets are also served under their original names, without the
+    long lived cache headers
+    """
+
+    def __init__(self, build_dir: Path, memory_max_size: Optional[int] = None) -> None:
+        from ..conf import settings
+
+        if memory_max_size is None: memory_max_size = settings.STATIC_MEMORY_MAX_SIZE
+        manifest = load_manifest(build_dir)
+        if manifest is None:
+            raise RuntimeError("Unable to find the frontend build at: %s" % (build_dir))
+
+        self.assets: Dict[str, StaticAsset] = {}
+        for name, info in manifest["assets"].items():
+            asset = StaticAsset(build_dir, info, info["immutable"], memory_max_size)
+            self.assets[info["path"]] = asset
+            if name != info["path"]:
+                self.assets[name] = StaticAsset(build_dir, info, False, memory_max_size)
+
+    def get_asset(self, path: str) -> Optional[StaticAsset]:
+        path = path.lstrip("/")
+        if path == "" or path.endswith("/"): path += "index.html"
+        return self.assets.get(path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            asset = self.get_asset(scope["path"])
+            response = asset.get_response(scope) if asset else PlainTextResponse("Not Found", status_code=404)
+
+        await response(scope, receive, send)
@@ -35,37 +35,3 @@ def parse_config_file(config_file: FilePath):
             raise TypeError("Please pass the database name in the configuration")
     return config
 
-
-@validate_call
-def setup_frontend(frontend_dir: DirectoryPath):
-    staticfiles_dir = frontend_dir.parent / "static"
-
-    # check if staticfiles_dir exists
-    if not staticfiles_dir.exists():
-        from ..conf import settings
-
-        # create the staticfiles_dir
-        staticfiles_dir.mkdir(parents=True)
-
-        # create the assets_dir
-        assets_dir = staticfiles_dir / "assets"
-        assets_dir.mkdir(parents=True)
-
-        with open(frontend_dir / "assets" / "index.js", "r") as index_js:
-            compiled_frontend_code = index_js.read()
-
-        compiled_frontend_code = compiled_frontend_code.replace(
-            "<FP_BASE_APP_URL>",
-            "/fastpanel"
-        )
-        compiled_frontend_code = compiled_frontend_code.replace(
-            "<FP_BASE_API_URL>",
-            "http://localhost:8000/fastpanel"
-        )
-
-        with open(assets_dir / "index.js", "w") as f:
-            f.write(compiled_frontend_code)
-        
-        copy_files(frontend_dir, staticfiles_dir, "index.js")
-
-    return staticfiles_dir
\ No newline at end of file
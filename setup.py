@@ -16,7 +16,7 @@ setup(
     python_requires=">=3.7",
     install_requires=[
         "fastapi==0.104.0",
-        "pymongo>=4.5.0",
+        "pymongo>=4.7.0",
         "uvicorn>=0.23.2",
         "PyYAML>=6.0.1",
         "motor>=3.3.1",
@@ -30,8 +30,13 @@ setup(
         "passlib>=1.7.4",
         "bcrypt==4.0.1",
         "jsonschema>=4.20.0",
-        "click>=8.1.7"
+        "click>=8.1.7",
+        "orjson>=3.8.3"
     ],
+    extras_require={
+        "brotli": ["brotli>=1.1.0"],
+        "argon2": ["argon2-cffi>=21.3.0"]
+    },
     entry_points={
         "console_scripts": [
             "fastpanel=fastpanel.cli:cli"